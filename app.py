@@ -1,10 +1,10 @@
 from flask import Flask, request, redirect, url_for, render_template, session, flash, send_from_directory
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
 import os
+import threading
 from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
 from portfolio_analysis.assess_portfolio import *
+from portfolio_analysis.repository import DB_NAME, MongoRepository, create_client
 import pandas as pd
 
 load_dotenv()
@@ -15,19 +15,23 @@ app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY')
 bcrypt = Bcrypt(app)
 
-# Form MongoDB connection
-uri = os.environ.get('MONGO_URI')
-client = MongoClient(uri, server_api=ServerApi('1'))
-db = client['sample_mflix']
-test_collection = db['test_users']
+# Form MongoDB connection; connect=False leaves the handshake to the first query
+client = create_client(connect=False)
+db = client[DB_NAME]
+repository = MongoRepository(db)
 
 
-# Test MongoDB connection
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
+# Test MongoDB connection and build the indexes in the background instead of blocking import on it
+def ping_mongo():
+    try:
+        client.admin.command('ping')
+        print("Pinged your deployment. You successfully connected to MongoDB!")
+        # The unique index on user is what turns a duplicate registration into DuplicateKeyError
+        repository.ensure_indexes()
+    except Exception as e:
+        print(e)
+
+threading.Thread(target=ping_mongo, name='mongo-ping', daemon=True).start()
 
 GRAPH_DIR = 'user_portfolio_graphs'
 
@@ -51,15 +55,8 @@ def register():
 
         hashed_pswd = bcrypt.generate_password_hash(password).decode('utf-8')
 
-        user_data = {
-            'user': username,
-            'password': hashed_pswd,
-            'collection_of_stocks': [],
-            'allocations': [],
-            'portfolio_value': 10000
-        }
-
-        test_collection.insert_one(user_data)
+        if not repository.create_user(username, hashed_pswd):
+            return 'That username is already taken.'
         return redirect(url_for('login'))
     return render_template('register.html')
 
@@ -70,7 +67,7 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
-        user = test_collection.find_one({'user': username})
+        user = repository.get_credentials(username)
         if user and bcrypt.check_password_hash(user['password'], password):
             session['username'] = username
             return redirect(url_for('dashboard'))
@@ -105,14 +102,7 @@ def update_portfolio():
             return 'Allocations must sum up to 100%.'
 
         # Update the user data in MongoDB
-        test_collection.update_one(
-            {'user': username},
-            {'$set': {
-                'collection_of_stocks': collection_of_stocks,
-                'allocations': [float(a) for a in allocations],
-                'portfolio_value': portfolio_value
-            }}
-        )
+        repository.update_portfolio(username, collection_of_stocks, allocations, portfolio_value)
         return redirect(url_for('dashboard'))
     return render_template('update_portfolio.html')
 
@@ -122,7 +112,7 @@ def update_portfolio():
 def dashboard():
     username = session['username']
     # Fetch user data
-    user = test_collection.find_one({'user': username})
+    user = repository.get_portfolio(username)
 
     # Generate list of S&P 500 Stocks
     sp500_dataFrame = pd.read_csv('sp500_symbols.csv')
@@ -153,15 +143,7 @@ def dashboard():
 # Tests Mongo_db connection, used for debugging
 @app.route("/mongo_test")
 def mongo_test():
-    user_data = {
-        'user': 'test_user_xxx',
-        'password': "abc123",
-        'collection_of_stocks': [],
-        'allocations': [],
-        'portfolio_value': 10000        
-    }
-
-    test_collection.insert_one(user_data)
+    repository.create_user('test_user_xxx', "abc123")
 
     try:
         client.admin.command('ping')
@@ -174,7 +156,7 @@ def mongo_test():
 @app.route("/user_data_test")
 def user_data_test():
     username = session.get('username')
-    user_data = test_collection.find_one({'user': username})
+    user_data = repository.get_portfolio(username)
 
     print(f"The user is: {username}")
 
@@ -185,7 +167,7 @@ def user_data_test():
     # print(f"allocs: {allocs}")
     # print(f"sv: {sv}")
 
-    dates = pd.date_range('2024-08-01', '2024-09-27')
+    dates = valuation_dates()
     symbols = user_data.get('collection_of_stocks', [])
     df_prices = get_data(symbols, dates)
     print("Data:")
@@ -202,34 +184,14 @@ def user_data_test():
     port_val = get_portfolio_returns(df_prices, allocs, sv)
     print(f"\nget_portfolio_returns() returns: \n{port_val.head(10)}")
 
-    directory = 'user_portfolios'
-    
-    filename = f"{session['username']}_portfolio.csv"
-    file_path = os.path.join(directory, filename)
-
-    print(f"The type of port_val: {type(port_val)}")
-
-    # port_val.to_csv(file_path, index=True)
-    # port_val.to_csv(file_path, index=True)
+    # Save it where the rest of the app reads portfolios from, as main.py's save_user_portfolio does
+    get_portfolio_store().replace(username, port_val)
 
-    port_val_df = port_val.reset_index()
-    port_val_df.columns = ['Date', 'Portfolio']
-    port_val_df.to_csv(file_path, index=False)
-
-    # Plot the user portfolio and save the image
-    plot_user_portfolio(username)
-
-    # Serve the image and display it to the frontend
-    image_filename = f"{username}_portfolio_graph.png"
+    # Plot the user portfolio; the chart comes back as a render cache path under static/
+    image_filename = plot_user_portfolio(username)
+    return redirect(url_for('static', filename=image_filename))
 
-    # Check if the image exists before serving
-    image_path = os.path.join(GRAPH_DIR, image_filename)
-    if os.path.exists(image_path):
-        return render_template('display_image.html', username=username)
-    else:
-        return f"Image for {username} not found.", 404
 
-    return "<p>This should have created a dataframe and printed it in the console.</p>"
     
 @app.route('/portfolio_image')
 def serve_image():
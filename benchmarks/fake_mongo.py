@@ -0,0 +1,179 @@
+import copy
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+from pymongo.errors import DuplicateKeyError
+
+# Just enough of pymongo's client/database/collection API for portfolio_analysis.repository,
+# kept in memory so load tests run without an Atlas cluster
+
+UpdateResult = namedtuple('UpdateResult', ['matched_count', 'modified_count', 'upserted_id'])
+BulkWriteResult = namedtuple('BulkWriteResult', ['matched_count', 'modified_count', 'upserted_count'])
+
+# Calls made by the current thread, so a load test can attribute them to the request it just sent
+_calls = threading.local()
+
+
+def calls_made():
+    return getattr(_calls, 'count', 0)
+
+
+def _matches(document, query):
+    for field, condition in query.items():
+        if isinstance(condition, dict) and '$in' in condition:
+            if document.get(field) not in condition['$in']:
+                return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+def _project(document, projection):
+    if not projection:
+        return copy.deepcopy(document)
+    included = [field for field, keep in projection.items() if keep and field != '_id']
+    if included:
+        result = {field: copy.deepcopy(document[field]) for field in included if field in document}
+    else:
+        result = {field: copy.deepcopy(value) for field, value in document.items() if field not in projection}
+    if projection.get('_id', 1) and '_id' in document:
+        result['_id'] = document['_id']
+    return result
+
+
+class FakeCollection:
+    def __init__(self, name, latency=0.0):
+        self.name = name
+        self.latency = latency
+        self._documents = []
+        # Unique indexes: field -> {value: document}, which also makes equality lookups O(1)
+        self._unique = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _call(self):
+        _calls.count = calls_made() + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _candidates(self, query):
+        for field, condition in query.items():
+            if field in self._unique and not isinstance(condition, dict):
+                document = self._unique[field].get(condition)
+                return [document] if document is not None else []
+        return self._documents
+
+    def create_index(self, keys, unique=False, name=None, **kwargs):
+        self._call()
+        field = keys if isinstance(keys, str) else keys[0][0]
+        if unique:
+            with self._lock:
+                by_value = {}
+                for document in self._documents:
+                    if document.get(field) in by_value:
+                        raise DuplicateKeyError(f"duplicate {field} {document.get(field)!r}")
+                    by_value[document.get(field)] = document
+                self._unique[field] = by_value
+        return name or f"{field}_1"
+
+    def find_one(self, query=None, projection=None):
+        self._call()
+        query = query or {}
+        with self._lock:
+            for document in self._candidates(query):
+                if _matches(document, query):
+                    return _project(document, projection)
+        return None
+
+    def find(self, query=None, projection=None):
+        self._call()
+        query = query or {}
+        with self._lock:
+            return [_project(document, projection) for document in self._candidates(query)
+                    if _matches(document, query)]
+
+    def _insert(self, document):
+        for field, by_value in self._unique.items():
+            if document.get(field) in by_value:
+                raise DuplicateKeyError(f"duplicate {field} {document.get(field)!r}")
+        document.setdefault('_id', next(self._ids))
+        self._documents.append(document)
+        for field, by_value in self._unique.items():
+            by_value[document.get(field)] = document
+
+    def insert_one(self, document):
+        self._call()
+        with self._lock:
+            self._insert(copy.deepcopy(document))
+
+    def insert_many(self, documents):
+        self._call()
+        with self._lock:
+            for document in documents:
+                self._insert(copy.deepcopy(document))
+
+    def _update(self, query, update, upsert):
+        for document in self._candidates(query):
+            if _matches(document, query):
+                document.update(copy.deepcopy(update.get('$set', {})))
+                return UpdateResult(1, 1, None)
+        if upsert:
+            document = dict(query)
+            document.update(copy.deepcopy(update.get('$set', {})))
+            self._insert(document)
+            return UpdateResult(0, 0, document['_id'])
+        return UpdateResult(0, 0, None)
+
+    def update_one(self, query, update, upsert=False):
+        self._call()
+        with self._lock:
+            return self._update(query, update, upsert)
+
+    def bulk_write(self, operations, ordered=True):
+        self._call()
+        matched = modified = upserted = 0
+        with self._lock:
+            for operation in operations:
+                # pymongo's UpdateOne keeps its arguments in these attributes
+                result = self._update(operation._filter, operation._doc, operation._upsert)
+                matched += result.matched_count
+                modified += result.modified_count
+                upserted += result.upserted_id is not None
+        return BulkWriteResult(matched, modified, upserted)
+
+
+class FakeDatabase:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name, self.latency)
+        return self._collections[name]
+
+
+class _Admin:
+    def command(self, name, *args, **kwargs):
+        return {'ok': 1.0}
+
+
+class FakeMongoClient:
+    """Drop-in for MongoClient; every client shares one set of databases, like one real cluster."""
+
+    databases = {}
+    # Seconds each call sleeps for, to stand in for a network round-trip
+    latency = 0.0
+
+    def __init__(self, *args, **kwargs):
+        self.admin = _Admin()
+
+    def __getitem__(self, name):
+        if name not in FakeMongoClient.databases:
+            FakeMongoClient.databases[name] = FakeDatabase(FakeMongoClient.latency)
+        return FakeMongoClient.databases[name]
+
+    def close(self):
+        pass
@@ -0,0 +1,195 @@
+"""Drive concurrent sessions through the main.py routes against an in-process Mongo stand-in.
+
+    python -m benchmarks.load_test --users 5000 --sessions 16 --iterations 5 --output load.json
+
+Boots main.py inside a synthetic workspace (see benchmarks/synthetic_data.py) with MongoClient
+swapped for benchmarks.fake_mongo, seeds every synthetic user, then has each session log in and
+loop over /dashboard (GET and a symbol POST), /update_portfolio and /league. Reports p50/p95/p99
+latency, requests/sec, error count and Mongo calls per request for each route, as JSON.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks import fake_mongo
+from benchmarks.synthetic_data import generate
+from portfolio_analysis.reference_data import reference_data
+
+PASSWORD = 'load-test-password'
+
+
+def boot_app(workspace, mongo_latency, render_workers):
+    """Import main.py with the fake Mongo in place, from inside the workspace; returns the module."""
+    if render_workers is not None:
+        os.environ['RENDER_WORKERS'] = str(render_workers)
+    os.environ.setdefault('SECRET_KEY', 'load-test')
+
+    fake_mongo.FakeMongoClient.latency = mongo_latency / 1000
+    import portfolio_analysis.repository as repository
+    repository.MongoClient = fake_mongo.FakeMongoClient
+
+    # main.py resolves its data files from the cwd
+    os.chdir(workspace)
+    import main
+    # Let the background warm-up finish pinging and indexing before seeding
+    main.mongo_ready.wait(timeout=30)
+    return main
+
+
+def seed(main, users):
+    """Insert every synthetic user (one shared password hash) and the stock metrics."""
+    from portfolio_analysis.metrics import cross_sectional_metrics, metrics_documents
+    from portfolio_analysis.price_panel import get_price_panel
+
+    # Hashing once keeps seeding fast; logins still pay the full bcrypt check
+    hashed_pswd = main.bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+    main.repository.users.insert_many([{**user, 'password': hashed_pswd} for user in users])
+
+    panel = get_price_panel()
+    covered = [symbol for symbol in reference_data.current().symbol_list if symbol in panel]
+    main.repository.upsert_stock_metrics(metrics_documents(cross_sectional_metrics(panel.frame(covered))))
+
+
+def run_session(app, user, symbols, iterations, rng, barrier, records):
+    """One logged-in browser: login, then iterations x (dashboard, symbol lookup, update, league)."""
+    client = app.test_client()
+
+    def timed(label, method, path, data=None):
+        calls_before = fake_mongo.calls_made()
+        start = time.perf_counter()
+        try:
+            response = client.open(path, method=method, data=data)
+            status = response.status_code
+        except Exception as e:
+            print(f"{label} raised {e!r}", file=sys.stderr)
+            status = None
+        records.append((label, time.perf_counter() - start, status, fake_mongo.calls_made() - calls_before))
+
+    barrier.wait()
+    timed('POST /login', 'POST', '/login', {'username': user['user'], 'password': PASSWORD})
+    for _ in range(iterations):
+        timed('GET /dashboard', 'GET', '/dashboard')
+        timed('POST /dashboard', 'POST', '/dashboard', {'symbol': str(rng.choice(symbols))})
+
+        picks = rng.choice(len(symbols), size=2, replace=False)
+        timed('POST /update_portfolio', 'POST', '/update_portfolio', {
+            'portfolio_value': '10000',
+            'stock_1': symbols[picks[0]], 'allocation_1': '60',
+            'stock_2': symbols[picks[1]], 'allocation_2': '40',
+        })
+        timed('GET /league', 'GET', '/league')
+
+
+def summarize(records, wall_seconds):
+    routes = {}
+    for label in dict.fromkeys(label for label, _, _, _ in records):
+        rows = [record for record in records if record[0] == label]
+        latencies_ms = np.array([latency for _, latency, _, _ in rows]) * 1000
+        routes[label] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, status, _ in rows if status is None or status >= 400),
+            'requests_per_second': len(rows) / wall_seconds,
+            'mean_ms': float(latencies_ms.mean()),
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p95_ms': float(np.percentile(latencies_ms, 95)),
+            'p99_ms': float(np.percentile(latencies_ms, 99)),
+            'max_ms': float(latencies_ms.max()),
+            'mongo_calls_per_request': float(np.mean([calls for _, _, _, calls in rows])),
+        }
+    return routes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='LoadTest',
+        description='Load-test the Flask routes against an in-process Mongo stand-in'
+    )
+    parser.add_argument('--workspace', dest="workspace",
+                        help="synthetic data directory; reused if it already holds a generated set")
+    parser.add_argument('--symbols', type=int, default=100, dest="symbols")
+    parser.add_argument('--years', type=float, default=1, dest="years")
+    parser.add_argument('--users', type=int, default=1000, dest="users")
+    parser.add_argument('--seed', type=int, default=0, dest="seed")
+    parser.add_argument('--sessions', type=int, default=8, dest="sessions", help="concurrent sessions")
+    parser.add_argument('--iterations', type=int, default=5, dest="iterations",
+                        help="dashboard/update/league rounds per session")
+    parser.add_argument('--mongo-latency-ms', type=float, default=0.0, dest="mongo_latency_ms",
+                        help="sleep per Mongo call, to stand in for the network round-trip to Atlas")
+    parser.add_argument('--render-workers', type=int, default=None, dest="render_workers",
+                        help="RENDER_WORKERS for the app; 0 draws charts inside the request")
+    parser.add_argument('--output', dest="output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix='melee_load_'))
+    output = os.path.abspath(args.output) if args.output else None
+
+    data_config = {'symbols': args.symbols, 'years': args.years, 'users': args.users, 'seed': args.seed}
+    config_file = os.path.join(workspace, 'load_test_config.json')
+    previous_config = None
+    if os.path.exists(config_file):
+        with open(config_file) as f:
+            previous_config = json.load(f)
+    if previous_config != data_config:
+        generate(workspace, args.symbols, args.years, args.users, args.seed)
+        with open(config_file, 'w') as f:
+            json.dump(data_config, f)
+
+    with open(os.path.join(workspace, 'users.json')) as f:
+        users = json.load(f)
+
+    # The app prints as it serves; keep that out of the report
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    quiet.__enter__()
+
+    main = boot_app(workspace, args.mongo_latency_ms, args.render_workers)
+    seed(main, users)
+    symbols = reference_data.current().symbol_list
+
+    rng = np.random.default_rng(args.seed)
+    session_users = [users[i] for i in rng.choice(len(users), size=min(args.sessions, len(users)), replace=False)]
+    records = []
+    barrier = threading.Barrier(len(session_users) + 1)
+    threads = [threading.Thread(target=run_session,
+                                args=(main.app, user, symbols, args.iterations,
+                                      np.random.default_rng(args.seed + i + 1), barrier, records))
+               for i, user in enumerate(session_users)]
+    for thread in threads:
+        thread.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+    main.render_service.shutdown()
+    quiet.__exit__(None, None, None)
+
+    routes = summarize(records, wall_seconds)
+    for label, route in routes.items():
+        print(f"{label:<24}{route['requests']:>6} req  p50 {route['p50_ms']:9.1f} ms  "
+              f"p95 {route['p95_ms']:9.1f} ms  p99 {route['p99_ms']:9.1f} ms  "
+              f"{route['requests_per_second']:7.1f}/s  {route['errors']} errors  "
+              f"{route['mongo_calls_per_request']:.1f} mongo calls", file=sys.stderr)
+
+    report = {
+        'config': {**data_config, 'sessions': len(session_users), 'iterations': args.iterations,
+                   'mongo_latency_ms': args.mongo_latency_ms, 'render_workers': args.render_workers},
+        'workspace': workspace,
+        'wall_seconds': wall_seconds,
+        'requests': len(records),
+        'requests_per_second': len(records) / wall_seconds,
+        'routes': routes,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
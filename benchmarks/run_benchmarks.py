@@ -0,0 +1,214 @@
+"""Time the data, valuation, leaderboard, metrics and plotting hot paths on synthetic data.
+
+    python -m benchmarks.run_benchmarks --symbols 500 --years 10 --users 50000 --output run.json
+    python -m benchmarks.run_benchmarks --workspace /tmp/bench --baseline run.json
+
+Each benchmark reports throughput, latency percentiles and the peak memory one call allocates
+(tracemalloc), as JSON, so two runs can be diffed or compared with --baseline.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import generate
+from calc_stats import calculate_metrics
+from portfolio_analysis.assess_portfolio import (_render_solo_stock, _render_user_portfolio,
+                                                 _render_user_vs_top_three_historical,
+                                                 _render_user_vs_top_three_weekly, find_historical_leaders,
+                                                 find_weekly_leaders, find_window_leaders, get_data,
+                                                 get_portfolio_returns)
+from portfolio_analysis.leaderboard import load_leaderboards
+from portfolio_analysis.metrics import cross_sectional_metrics
+from portfolio_analysis.portfolio_store import get_portfolio_store
+from portfolio_analysis.price_panel import get_price_panel
+from portfolio_analysis.rolling import DEFAULT_WINDOW, RollingAnalytics
+
+# Timed calls per benchmark, by kind; plots and whole-dataset passes are much slower per call
+ITERATIONS = {'fast': 200, 'slow': 5, 'plot': 5}
+
+
+def measure(fn, iterations, warmup=1):
+    """Call fn warmup + iterations times; latencies come from the timed calls, memory from one more."""
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    # Peak memory from a separate traced call, so tracing overhead stays out of the timings
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    total = float(np.sum(latencies))
+    return {
+        'iterations': iterations,
+        'total_seconds': total,
+        'throughput_per_second': iterations / total if total > 0 else None,
+        'mean_ms': float(latencies_ms.mean()),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+        'peak_memory_bytes': int(peak),
+    }
+
+
+def cycling(items):
+    """Zero-argument callable returning the next item each call, so repeated calls hit different inputs."""
+    position = [0]
+
+    def next_item():
+        item = items[position[0] % len(items)]
+        position[0] += 1
+        return item
+    return next_item
+
+
+def benchmarks(users, dates, image_dir, sample_size, seed):
+    """(name, callable, kind) for every benchmark; kind picks the iteration count."""
+    rng = np.random.default_rng(seed)
+    sample = [users[i] for i in rng.choice(len(users), size=min(sample_size, len(users)), replace=False)]
+    next_user = cycling(sample)
+
+    # Valuation inputs prepared up front so get_portfolio_returns is timed on its own
+    prepared = [(get_data(user['collection_of_stocks'], dates), [a / 100 for a in user['allocations']],
+                 user['portfolio_value']) for user in sample]
+    next_prepared = cycling(prepared)
+
+    panel = get_price_panel()
+    store = get_portfolio_store()
+    next_symbol = cycling(list(panel.symbols))
+    next_image = cycling([os.path.join(image_dir, f"bench_{i}.png") for i in range(4)])
+
+    def plot_historical():
+        username = next_user()['user']
+        _render_user_vs_top_three_historical(username, find_historical_leaders(username), next_image())
+
+    def plot_weekly():
+        username = next_user()['user']
+        _render_user_vs_top_three_weekly(username, find_weekly_leaders(username), DEFAULT_WINDOW, next_image())
+
+    return [
+        ('get_data', lambda: get_data(next_user()['collection_of_stocks'], dates), 'fast'),
+        ('get_portfolio_returns', lambda: get_portfolio_returns(*next_prepared()), 'fast'),
+        ('find_historical_leaders', lambda: find_historical_leaders(next_user()['user']), 'fast'),
+        ('find_weekly_leaders', lambda: find_weekly_leaders(next_user()['user']), 'fast'),
+        ('find_window_leaders_1m', lambda: find_window_leaders(next_user()['user'], '1m'), 'fast'),
+        ('calculate_metrics', lambda: calculate_metrics(os.path.join('data', f"{next_symbol()}.csv")), 'fast'),
+        ('cross_sectional_metrics', lambda: cross_sectional_metrics(panel.frame(panel.symbols)), 'slow'),
+        ('load_leaderboards', lambda: load_leaderboards(), 'slow'),
+        ('rolling_analytics_build', lambda: RollingAnalytics(store.frame()), 'slow'),
+        ('plot_solo_stock', lambda: _render_solo_stock(next_symbol(), next_image()), 'plot'),
+        ('plot_user_portfolio', lambda: _render_user_portfolio(next_user()['user'], next_image()), 'plot'),
+        ('plot_user_vs_top_three_historical', plot_historical, 'plot'),
+        ('plot_user_vs_top_three_weekly', plot_weekly, 'plot'),
+    ]
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def compare(results, baseline_file):
+    """Print each benchmark's p50 latency next to an earlier run's, with the speedup."""
+    with open(baseline_file) as f:
+        baseline = json.load(f)['results']
+
+    print(f"{'benchmark':<36}{'base p50 ms':>14}{'p50 ms':>12}{'speedup':>10}", file=sys.stderr)
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['p50_ms'], result['p50_ms']
+        speedup = before / after if after > 0 else float('inf')
+        print(f"{name:<36}{before:>14.3f}{after:>12.3f}{speedup:>9.2f}x", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='RunBenchmarks',
+        description='Benchmark the Market Melee hot paths on reproducible synthetic data'
+    )
+    parser.add_argument('--workspace', dest="workspace",
+                        help="directory for the synthetic data; reused if it already holds a generated set")
+    parser.add_argument('--symbols', type=int, default=100, dest="symbols")
+    parser.add_argument('--years', type=float, default=2, dest="years")
+    parser.add_argument('--users', type=int, default=1000, dest="users")
+    parser.add_argument('--seed', type=int, default=0, dest="seed")
+    parser.add_argument('--sample', type=int, default=100, dest="sample",
+                        help="distinct users the per-user benchmarks cycle through")
+    parser.add_argument('--only', nargs='*', dest="only", help="run just these benchmarks")
+    parser.add_argument('--output', dest="output", help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', dest="baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix='melee_bench_'))
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    config = {'symbols': args.symbols, 'years': args.years, 'users': args.users, 'seed': args.seed,
+              'sample': args.sample}
+    config_file = os.path.join(workspace, 'benchmark_config.json')
+    generated_seconds = None
+    previous_config = None
+    if os.path.exists(config_file):
+        with open(config_file) as f:
+            previous_config = json.load(f)
+    if previous_config != config:
+        start = time.perf_counter()
+        generate(workspace, args.symbols, args.years, args.users, args.seed)
+        generated_seconds = time.perf_counter() - start
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+
+    # The app resolves data/, panel/, portfolio_store/ and sp500_symbols.csv relative to the cwd
+    os.chdir(workspace)
+    with open('users.json') as f:
+        users = json.load(f)
+    dates = pd.DatetimeIndex(get_price_panel().index)
+    image_dir = tempfile.mkdtemp(prefix='melee_bench_images_')
+
+    results = {}
+    for name, fn, kind in benchmarks(users, dates, image_dir, args.sample, args.seed):
+        if args.only and name not in args.only:
+            continue
+        # The functions under test print as they go; keep that out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = measure(fn, ITERATIONS[kind])
+        print(f"{name:<36}p50 {results[name]['p50_ms']:9.3f} ms   "
+              f"p99 {results[name]['p99_ms']:9.3f} ms   "
+              f"{results[name]['throughput_per_second']:10.1f}/s", file=sys.stderr)
+
+    report = {'config': config, 'environment': environment(), 'workspace': workspace,
+              'generated_seconds': generated_seconds, 'results': results}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if baseline:
+        compare(results, baseline)
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from portfolio_analysis.portfolio_store import PortfolioStore
+from portfolio_analysis.price_panel import build_price_panel
+from portfolio_analysis.valuation import build_allocation_matrix, value_portfolios
+
+TRADING_DAYS_PER_YEAR = 252
+# Every synthetic history ends on the last day of the checked-in data
+END_DATE = '2024-09-27'
+# Users valued per matmul while filling the portfolio store, to bound memory at 50k+ users
+USER_CHUNK = 2000
+
+
+def synthetic_symbols(n_symbols):
+    """Ticker-like names (AAAA, AAAB, ...) that cannot collide with SPY."""
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    symbols = []
+    i = 0
+    while len(symbols) < n_symbols:
+        name = ''.join(letters[(i // 26 ** p) % 26] for p in (3, 2, 1, 0))
+        if name != 'SPY':
+            symbols.append(name)
+        i += 1
+    return symbols
+
+
+def price_history(rng, dates, n_series):
+    """Geometric Brownian motion closes, dates x n_series, each with its own drift and volatility."""
+    drift = rng.normal(0.0003, 0.0004, n_series)
+    volatility = rng.uniform(0.008, 0.03, n_series)
+    log_returns = rng.normal(drift, volatility, (len(dates), n_series))
+    start = rng.uniform(10, 500, n_series)
+    return start * np.exp(np.cumsum(log_returns, axis=0))
+
+
+def write_price_csv(file_path, dates, closes, rng):
+    # Same columns as the Yahoo downloads in data/
+    opens = closes * (1 + rng.normal(0, 0.003, len(closes)))
+    df = pd.DataFrame({
+        'Open': opens,
+        'High': np.maximum(opens, closes) * (1 + rng.uniform(0, 0.01, len(closes))),
+        'Low': np.minimum(opens, closes) * (1 - rng.uniform(0, 0.01, len(closes))),
+        'Close': closes,
+        'Adj Close': closes,
+        'Volume': rng.integers(100000, 50000000, len(closes)),
+    }, index=pd.DatetimeIndex(dates, name='Date'))
+    df.to_csv(file_path, date_format='%Y-%m-%d')
+
+
+def synthetic_users(rng, n_users, symbols, max_holdings=10):
+    """Mongo-shaped user documents: 1-10 distinct symbols with whole-percent allocations summing to 100."""
+    users = []
+    for i in range(n_users):
+        k = int(rng.integers(1, max_holdings + 1))
+        picks = rng.choice(len(symbols), size=k, replace=False)
+        weights = rng.dirichlet(np.ones(k)) * 100
+        allocations = np.floor(weights)
+        allocations[0] += 100 - allocations.sum()
+        users.append({
+            'user': f"user{i:06d}",
+            'collection_of_stocks': [symbols[j] for j in picks],
+            'allocations': [float(a) for a in allocations],
+            'portfolio_value': 10000,
+        })
+    return users
+
+
+def generate(workspace, n_symbols=100, years=2, n_users=1000, seed=0):
+    """Write a self-contained app data directory: data/*.csv, sp500_symbols.csv, the price panel,
+    users.json and a portfolio store holding every user's value series. Same seed, same bytes."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=END_DATE, periods=int(years * TRADING_DAYS_PER_YEAR))
+    symbols = synthetic_symbols(n_symbols)
+
+    data_dir = os.path.join(workspace, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    closes = price_history(rng, dates, n_symbols + 1)
+    for column, symbol in enumerate(symbols + ['SPY']):
+        write_price_csv(os.path.join(data_dir, f"{symbol}.csv"), dates, closes[:, column], rng)
+    pd.DataFrame({'Symbol': symbols}).to_csv(os.path.join(workspace, 'sp500_symbols.csv'), index=False)
+    build_price_panel(data_dir, os.path.join(workspace, 'panel'), os.path.join(workspace, 'sp500_symbols.csv'))
+
+    users = synthetic_users(rng, n_users, symbols)
+    with open(os.path.join(workspace, 'users.json'), 'w') as f:
+        json.dump(users, f)
+
+    # Value every user the way save_user_portfolio does, a chunk of users per matmul
+    store = PortfolioStore(os.path.join(workspace, 'portfolio_store'))
+    prices = closes[:, :n_symbols]
+    for start in range(0, n_users, USER_CHUNK):
+        chunk = users[start:start + USER_CHUNK]
+        allocations = build_allocation_matrix(
+            [(user['collection_of_stocks'], [a / 100 for a in user['allocations']]) for user in chunk], symbols)
+        values = value_portfolios(prices, allocations, 10000, decimals=3)
+        store.replace_many(pd.DataFrame(values, index=dates, columns=[user['user'] for user in chunk]))
+
+    print(f"Generated {n_symbols} symbols x {len(dates)} days and {n_users} users in {workspace}/")
+    return {'symbols': symbols, 'dates': dates, 'users': users}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='SyntheticData',
+        description='Generate a reproducible synthetic price history and user base for benchmarking'
+    )
+    parser.add_argument('workspace')
+    parser.add_argument('--symbols', type=int, default=100, dest="symbols")
+    parser.add_argument('--years', type=float, default=2, dest="years")
+    parser.add_argument('--users', type=int, default=1000, dest="users")
+    parser.add_argument('--seed', type=int, default=0, dest="seed")
+    args = parser.parse_args()
+
+    generate(args.workspace, args.symbols, args.years, args.users, args.seed)
@@ -1,21 +1,17 @@
 import pandas as pd
 import numpy as np
 import os
-from pymongo import MongoClient
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
+from portfolio_analysis.metrics import cross_sectional_metrics, metrics_documents
+from portfolio_analysis.price_panel import build_price_panel, get_price_panel
+from portfolio_analysis.reference_data import touch_reference_stamp
+from portfolio_analysis.repository import DB_NAME, MongoRepository, create_client
+from portfolio_analysis.running_metrics import load_running_metrics
 
 load_dotenv()
 
-# Get MongoDB connection URI from environment variables
-uri = os.environ.get('MONGO_URI')
-
-# Create a new client and connect to the server
-client = MongoClient(uri)
-
-# Select the database and collection
-db = client['sample_mflix']  # Replace with your database name
-metrics_collection = db['stock_metrics']  # New collection for stock metrics
-
 def calculate_metrics(file_path):
     try:
         # Load the stock data from a CSV file
@@ -72,43 +68,86 @@ def calculate_metrics(file_path):
         print(f"An error occurred: {str(e)}")
         return None
 
+def metrics_document(symbol, metrics):
+    # Shape of a stock_metrics document in MongoDB
+    return {
+        'stock_name': symbol,
+        'Cumulative Return': float(metrics['Cumulative Return']),
+        'Avg. Daily Return': float(metrics['Average Daily Return']),
+        'Volatility': float(metrics['Volatility (Standard Deviation)']),
+        'Sharpe Ratio': float(metrics['Sharpe Ratio']),
+        'Sortino Ratio': float(metrics['Sortino Ratio']),
+    }
+
+def compute_all_metrics(symbols, data_directory='data/', workers=None):
+    """Compute metrics for every symbol across a process pool, returning one document per symbol."""
+    file_paths = [os.path.join(data_directory, f"{symbol}.csv") for symbol in symbols]
+
+    if workers == 1:
+        results = map(calculate_metrics, file_paths)
+        return [metrics_document(symbol, metrics) for symbol, metrics in zip(symbols, results) if metrics]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(calculate_metrics, file_paths, chunksize=16)
+        return [metrics_document(symbol, metrics) for symbol, metrics in zip(symbols, results) if metrics]
+
+def compute_panel_metrics(symbols):
+    """Compute metrics for every symbol in one vectorized pass over the price panel."""
+    panel = get_price_panel() or build_price_panel()
+    covered = [symbol for symbol in symbols if symbol in panel]
+    return metrics_documents(cross_sectional_metrics(panel.frame(covered)))
+
+def compute_running_metrics(symbols):
+    """Read metrics off the persisted running statistics, without touching any price history."""
+    table = load_running_metrics().metrics_table()
+    return metrics_documents(table.loc[[symbol for symbol in symbols if symbol in table.index]])
+
+def publish_metrics(repository, documents):
+    """Upsert metric documents into MongoDB and tell the running app to reload them."""
+    # One round-trip for every symbol, keyed on stock_name so re-runs update instead of duplicating
+    repository.ensure_indexes()
+    result = repository.upsert_stock_metrics(documents)
+    if result is not None:
+        print(f"Upserted metrics into MongoDB: {result.upserted_count} inserted, "
+              f"{result.modified_count} updated.")
+
+    # Tell the running app to reload its cached stock metrics
+    touch_reference_stamp()
+    return result
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog='CalcStats',
+        description='Compute stock metrics for every S&P 500 symbol and upsert them into MongoDB'
+    )
+    parser.add_argument('-m', '--mode', choices=['panel', 'pool', 'running'], default='panel', dest="mode",
+                        help="panel: one vectorized pass over the price panel; pool: per-file in a process pool; "
+                             "running: publish the streaming state import_stock_data.py keeps up to date")
+    parser.add_argument('-w', '--workers', type=int, default=None, dest="workers",
+                        help="pool mode: processes to compute metrics with (default: one per CPU, 1 runs inline)")
+    args = parser.parse_args()
+
     # Load the symbols file
     symbols_file_path = 'sp500_symbols.csv'  # Ensure this file exists
-    sp500_symbols = pd.read_csv(symbols_file_path)
+    sp500_symbols = pd.read_csv(symbols_file_path)['Symbol'].tolist()
 
     # Directory where the stock data files are located
     data_directory = 'data/'
 
-    # Iterate through each symbol in the sp500_symbols file
-    for index, row in sp500_symbols.iterrows():
-        symbol = row['Symbol']
-        file_path = os.path.join(data_directory, f"{symbol}.csv")
-
-        # Calculate metrics for each symbol's CSV file
-        print(f"Calculating metrics for {symbol}...")
-
-        metrics = calculate_metrics(file_path)
-
-        if metrics:
-            print(f"Metrics for {symbol}:")
-            for key, value in metrics.items():
-                print(f"  {key}: {value}")
-
-            # Create a document to insert into MongoDB
-            document = {
-                'stock_name': symbol,
-                'Cumulative Return': float(metrics['Cumulative Return']),
-                'Avg. Daily Return': float(metrics['Average Daily Return']),
-                'Volatility': float(metrics['Volatility (Standard Deviation)']),
-                'Sharpe Ratio': float(metrics['Sharpe Ratio']),
-                'Sortino Ratio': float(metrics['Sortino Ratio']),
-            }
-
-            # Insert the document into MongoDB
-            try:
-                metrics_collection.insert_one(document)
-                print(f"Metrics for {symbol} inserted into MongoDB.")
-            except Exception as e:
-                print(f"Error inserting metrics for {symbol} into MongoDB: {str(e)}")
-        print("\n")
+    print(f"Calculating metrics for {len(sp500_symbols)} symbols...")
+    if args.mode == 'panel':
+        documents = compute_panel_metrics(sp500_symbols)
+    elif args.mode == 'running':
+        documents = compute_running_metrics(sp500_symbols)
+    else:
+        documents = compute_all_metrics(sp500_symbols, data_directory, args.workers)
+    print(f"Calculated metrics for {len(documents)} symbols.")
+
+    # Create a new client for MONGO_URI, with the app's pool and timeout settings;
+    # stock metrics live in the database's stock_metrics collection
+    client = create_client()
+    repository = MongoRepository(client[DB_NAME])
+    try:
+        publish_metrics(repository, documents)
+    except Exception as e:
+        print(f"Error writing metrics into MongoDB: {str(e)}")
@@ -0,0 +1,25 @@
+# gunicorn -c gunicorn.conf.py main:app
+import importlib
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# main itself is imported in each worker: its Mongo client and warm-up thread must not cross a fork
+preload_app = False
+
+
+def on_starting(server):
+    # Runs once in the master before any worker forks. Map the current price panel generation
+    # (prices, SPY, symbol registry) and load the analysis stack here, so every worker inherits
+    # the same read-only mappings and imported modules instead of building its own.
+    importlib.import_module('portfolio_analysis.assess_portfolio')  # pandas, matplotlib
+    from portfolio_analysis.price_panel import get_price_panel
+
+    panel = get_price_panel()
+    if panel is None:
+        server.log.warning("No price panel built yet; workers will fall back to the CSVs.")
+    else:
+        server.log.info(f"Preloaded price panel: {len(panel.symbols)} symbols x {len(panel.dates)} dates "
+                        f"from {os.path.dirname(panel.fingerprint[0])}")
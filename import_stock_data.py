@@ -1,26 +1,195 @@
 import pandas as pd
 import os
-import yfinance as yf
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from portfolio_analysis.price_panel import build_price_panel
+from portfolio_analysis.reference_data import touch_reference_stamp
+from portfolio_analysis.running_metrics import load_running_metrics, seed_running_metrics
+
+# Column layout of every data/<SYMBOL>.csv
+CSV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+# Not in the S&P 500 list, but the app compares every portfolio against it
+BENCHMARK_SYMBOLS = ['SPY']
 
 def symbol_to_path(symbol, base_dir=os.path.join(".", "data")):
     """Return CSV file path given ticker symbol."""
     return os.path.join(base_dir, f"{symbol}.csv")
 
-def get_data_yf_symbol(symbol, start_date, end_date):
-    """Fetch stock data (adjusted close) for the given symbol from Yahoo Finance."""
-    df = yf.download(
-        symbol,
-        interval="1d",
-        start=start_date,
-        end=end_date
-    )
-    return df
+
+class PriceSource:
+    """Where daily price history comes from; subclasses implement fetch."""
+
+    # How many symbols one fetch call should carry
+    batch_size = 1
+
+    def fetch(self, symbols, start_date, end_date):
+        """Return {symbol: DataFrame of CSV_COLUMNS indexed by Date} for dates in [start_date, end_date)."""
+        raise NotImplementedError
+
+
+class YahooSource(PriceSource):
+    """Yahoo Finance through yfinance, many tickers per request."""
+
+    batch_size = 50
+
+    def fetch(self, symbols, start_date, end_date):
+        # Imported here so offline runs against LocalFileSource don't need yfinance installed
+        import yfinance as yf
+
+        df = yf.download(
+            symbols,
+            interval="1d",
+            start=start_date,
+            end=end_date,
+            group_by='ticker',
+            auto_adjust=False,
+            progress=False
+        )
+
+        frames = {}
+        for symbol in symbols:
+            if isinstance(df.columns, pd.MultiIndex):
+                if symbol not in df.columns.get_level_values(0):
+                    continue
+                symbol_df = df[symbol]
+            else:
+                symbol_df = df
+            frames[symbol] = symbol_df[CSV_COLUMNS].dropna(how='all')
+        return frames
+
+
+class LocalFileSource(PriceSource):
+    """Reads <SYMBOL>.csv files from another directory, for offline runs and testing."""
+
+    batch_size = 100
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbols, start_date, end_date):
+        frames = {}
+        for symbol in symbols:
+            file_path = symbol_to_path(symbol, self.directory)
+            if not os.path.exists(file_path):
+                continue
+            df = pd.read_csv(file_path, index_col='Date', parse_dates=True, float_precision='round_trip')
+            frames[symbol] = df.loc[(df.index >= start_date) & (df.index < end_date), CSV_COLUMNS]
+        return frames
+
+
+def last_stored_date(symbol, base_dir):
+    """Date of the last row in a symbol's CSV, read from the end of the file, or None."""
+    file_path = symbol_to_path(symbol, base_dir)
+    if not os.path.exists(file_path):
+        return None
+
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - 512, 0))
+        lines = f.read().decode('utf-8').strip().splitlines()
+
+    last_field = lines[-1].split(',')[0] if lines else ''
+    if last_field in ('', 'Date'):
+        return None
+    return pd.Timestamp(last_field)
+
+
+def append_rows(symbol, df, base_dir):
+    """Append new rows to a symbol's CSV by writing a complete copy and swapping it in."""
+    file_path = symbol_to_path(symbol, base_dir)
+    tmp_path = f"{file_path}.tmp"
+
+    existing = b''
+    if os.path.exists(file_path):
+        with open(file_path, 'rb') as f:
+            existing = f.read()
+        if existing and not existing.endswith(b'\n'):
+            existing += b'\n'
+
+    new_rows = df[CSV_COLUMNS].to_csv(header=not existing, index_label='Date', date_format='%Y-%m-%d')
+    with open(tmp_path, 'wb') as f:
+        f.write(existing)
+        f.write(new_rows.encode('utf-8'))
+    os.replace(tmp_path, file_path)
+
+
+def _fetch_batch(source, symbols, start_date, end_date):
+    try:
+        return source.fetch(symbols, start_date, end_date)
+    except Exception as e:
+        print(f"Fetching {len(symbols)} symbols from {start_date:%Y-%m-%d} failed: {e}")
+        return {}
+
+
+def ingest(symbols, start_date, end_date, source, base_dir=os.path.join(".", "data"), workers=4, full=False):
+    """Fetch only the rows after each symbol's last stored date and append them.
+
+    Returns {symbol: DataFrame of the rows that were added}.
+    """
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
+    os.makedirs(base_dir, exist_ok=True)
+
+    # Group symbols by the first date they still need, so each group shares a request window
+    windows = {}
+    for symbol in symbols:
+        last_date = None if full else last_stored_date(symbol, base_dir)
+        first_needed = start_date if last_date is None else max(start_date, last_date + pd.Timedelta(days=1))
+        if first_needed < end_date:
+            windows.setdefault(first_needed, []).append(symbol)
+
+    batches = []
+    for first_needed, window_symbols in windows.items():
+        for i in range(0, len(window_symbols), source.batch_size):
+            batches.append((window_symbols[i:i + source.batch_size], first_needed))
+
+    print(f"Fetching {sum(len(batch) for batch, _ in batches)} symbols in {len(batches)} batches...")
+
+    new_rows = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_fetch_batch, source, batch, first_needed, end_date)
+                   for batch, first_needed in batches]
+        for future in futures:
+            for symbol, df in future.result().items():
+                if df.empty:
+                    continue
+                if full and os.path.exists(symbol_to_path(symbol, base_dir)):
+                    os.remove(symbol_to_path(symbol, base_dir))
+                append_rows(symbol, df, base_dir)
+                new_rows[symbol] = df
+
+    print(f"Appended new rows for {len(new_rows)} symbols.")
+    return new_rows
+
+
+def refresh_prices(symbols, start_date, end_date, source, workers=4, full=False):
+    """Ingest new rows, repack the price panel and fold the rows into the running metrics."""
+    new_rows = ingest(symbols, start_date, end_date, source, workers=workers, full=full)
+
+    # Repack the memory-mapped price panel the app reads from; the first run seeds the metrics from it
+    build_price_panel()
+
+    # Running return statistics per symbol; only rows newer than each symbol's last folded-in date apply,
+    # so a full re-download rebuilds them from the new panel instead
+    if full:
+        running_metrics = seed_running_metrics()
+    else:
+        running_metrics = load_running_metrics()
+        for symbol, df in new_rows.items():
+            running_metrics.update(symbol, df['Adj Close'])
+    running_metrics.save()
+
+    # Tell the running app to reload its symbol list and SPY series
+    touch_reference_stamp()
+    return new_rows
+
 
 if __name__ == '__main__':
     # Load symbols from sp500_symbols.csv
     symbols_df = pd.read_csv('sp500_symbols.csv')
-    symbols = symbols_df['Symbol'].tolist()
+    symbols = symbols_df['Symbol'].tolist() + BENCHMARK_SYMBOLS
 
     # Set default date range
     date_start = '2024-08-01'
@@ -29,22 +198,25 @@ if __name__ == '__main__':
     # Parse arguments for start and end dates if provided
     parser = argparse.ArgumentParser(
         prog='GetYFData',
-        description='Download historical stock data from Yahoo Finance'
+        description='Download new daily stock data and append it to data/<SYMBOL>.csv'
     )
 
     parser.add_argument('-s', action="store", dest="date_start", default=date_start)
     parser.add_argument('-e', action="store", dest="date_end", default=date_end)
+    parser.add_argument('--source', choices=['yahoo', 'local'], default='yahoo', dest="source")
+    parser.add_argument('--source-dir', action="store", dest="source_dir",
+                        help="directory of <SYMBOL>.csv files for --source local")
+    parser.add_argument('-w', '--workers', type=int, default=4, dest="workers",
+                        help="concurrent fetch requests")
+    parser.add_argument('--full', action="store_true", dest="full",
+                        help="refetch the whole date range and overwrite the stored files")
     args = parser.parse_args()
 
-    # Ensure the data directory exists
-    os.makedirs("data", exist_ok=True)
+    if args.source == 'local':
+        if not args.source_dir:
+            parser.error("--source local needs --source-dir")
+        source = LocalFileSource(args.source_dir)
+    else:
+        source = YahooSource()
 
-    # Loop over all symbols
-    for symbol in symbols:
-        print(f"Downloading data for {symbol}...")
-        df = get_data_yf_symbol(symbol, args.date_start, args.date_end)
-        if not df.empty:
-            df.to_csv(symbol_to_path(symbol))
-            print(f"Data for {symbol} saved.")
-        else:
-            print(f"No data found for {symbol}.")
\ No newline at end of file
+    refresh_prices(symbols, args.date_start, args.date_end, source, workers=args.workers, full=args.full)
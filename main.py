@@ -1,77 +1,197 @@
-from flask import Flask, request, redirect, url_for, render_template, session, flash, send_from_directory
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
 import os
+import threading
+import time
+
+# Startup is measured from here, so the budget below covers this module's imports too
+_import_started = time.perf_counter()
+
+from flask import Flask, request, redirect, url_for, render_template, session, flash, send_from_directory, jsonify
 from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
-from portfolio_analysis.assess_portfolio import *
-import pandas as pd
+from portfolio_analysis.profiling import init_app as init_profiling
+from portfolio_analysis.render_service import render_service
+from portfolio_analysis.repository import DB_NAME, MongoRepository, create_client
+from portfolio_analysis.revaluation import RevaluationQueue
+from portfolio_analysis.tracing import init_app as init_tracing, log_request, observe, span, traced
+
+# pandas, matplotlib and the analysis modules are imported inside the routes that use them,
+# so a fresh worker serves /welcome and /login without loading them first
 
 load_dotenv()
 
-app = Flask(__name__)
+# Worker boot (this module's imports plus create_app) should fit in this; slower boots log a warning
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 500))
+
+GRAPH_DIR = 'user_portfolio_graphs'
+MAX_RANKINGS_PAGE = 500
 
-# Get secret key for sessions, Bcrypt for pswd hashing
-app.secret_key = os.environ.get('SECRET_KEY')
-bcrypt = Bcrypt(app)
+# Bcrypt for pswd hashing, bound to the app in create_app
+bcrypt = Bcrypt()
 
-# Form MongoDB connection
-uri = os.environ.get('MONGO_URI')
-client = MongoClient(uri, server_api=ServerApi('1'))
-db = client['sample_mflix']
-test_collection = db['test_users']
-stock_metrics_collection = db['stock_metrics']
+# Set by create_app. The client is created with connect=False, so nothing waits on the network
+# until the first query; the background warm-up pings and builds the indexes in the meantime.
+client = None
+repository = None
+# Set once the warm-up has pinged Mongo, built the indexes and pointed the reference data at them
+mongo_ready = threading.Event()
 
-# Test MongoDB connection
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
+# (rule, view, options) for every route below, added to the app by create_app
+ROUTES = []
 
-GRAPH_DIR = 'user_portfolio_graphs'
+
+def route(rule, **options):
+    """Like app.route, but recorded for create_app instead of bound to one app at import time."""
+    def decorator(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return decorator
+
+
+def warm_up(client, repository):
+    # Test MongoDB connection
+    try:
+        with span('mongo.ping'):
+            client.admin.command('ping')
+        print("Pinged your deployment. You successfully connected to MongoDB!")
+    except Exception as e:
+        print(e)
+
+    # Unique indexes on user and stock_name, so every lookup below is an index hit
+    repository.ensure_indexes()
+
+    # Symbol registry, normalized SPY and stock metrics load on first use, from this collection
+    from portfolio_analysis.reference_data import reference_data
+    reference_data.configure(repository.stock_metrics)
+    mongo_ready.set()
+
+
+def report_startup(imports_seconds, create_seconds):
+    total_ms = (imports_seconds + create_seconds) * 1000
+    observe('app.startup', imports_seconds + create_seconds)
+    log_request({'event': 'startup',
+                 'pid': os.getpid(),
+                 'imports_ms': round(imports_seconds * 1000, 3),
+                 'create_app_ms': round(create_seconds * 1000, 3),
+                 'total_ms': round(total_ms, 3),
+                 'budget_ms': STARTUP_BUDGET_MS})
+    if total_ms > STARTUP_BUDGET_MS:
+        print(f"WARNING: worker startup took {total_ms:.0f} ms, over the {STARTUP_BUDGET_MS:.0f} ms budget.")
+
+
+def create_app():
+    """Build the app without blocking on Mongo or loading the analysis and plotting stack."""
+    global client, repository, _import_started
+    started = time.perf_counter()
+
+    app = Flask(__name__)
+
+    # Get secret key for sessions
+    app.secret_key = os.environ.get('SECRET_KEY')
+    bcrypt.init_app(app)
+
+    # Per-request span timings in the logs, histograms of them at /metrics
+    init_tracing(app)
+    # cProfile a request on demand (X-Profile-Token / ?profile= with PROFILE_TOKEN) or by PROFILE_SAMPLE_RATE
+    init_profiling(app)
+
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+
+    # Form MongoDB connection, pooled with the settings in portfolio_analysis/repository.py
+    mongo_ready.clear()
+    client = create_client(connect=False)
+    repository = MongoRepository(client[DB_NAME])
+    threading.Thread(target=warm_up, args=(client, repository), name='mongo-warm-up', daemon=True).start()
+
+    # Only the first app in a process paid for the imports
+    imports_seconds = 0.0
+    if _import_started is not None:
+        imports_seconds = started - _import_started
+        _import_started = None
+    report_startup(imports_seconds, time.perf_counter() - started)
+    return app
+
+
+# Computes a user's portfolio value series, saves it, and moves them on the leaderboards
+@traced('valuation.save_user_portfolio')
+def save_user_portfolio(username, user_data):
+    from portfolio_analysis.assess_portfolio import (get_data, get_portfolio_returns, portfolio_inputs,
+                                                     valuation_dates)
+    from portfolio_analysis.leaderboard import record_portfolio
+    from portfolio_analysis.portfolio_store import get_portfolio_store
+    from portfolio_analysis.rolling import record_rolling
+
+    dates = valuation_dates()
+    symbols = user_data.get('collection_of_stocks', [])
+    allocs = user_data.get('allocations', [])
+    sv = user_data.get('portfolio_value', 0)
+
+    # Same holdings, start value and price generation as the stored series: nothing to recompute,
+    # and the boards already hold it, so a repeat view stays a pure read
+    store = get_portfolio_store()
+    inputs = portfolio_inputs(symbols, allocs, sv, dates)
+    with span('store.inputs_match'):
+        unchanged = store.inputs_match(username, inputs)
+    if unchanged:
+        return store.series(username)
+
+    df_prices = get_data(symbols, dates)
+    allocs = [alloc / 100 for alloc in allocs]
+
+    port_val = get_portfolio_returns(df_prices, allocs, sv)
+
+    # Rewrites only this user's row of the shared portfolio matrix, with the inputs it came from
+    with span('store.replace'):
+        store.replace(username, port_val, inputs)
+    with span('rolling.record'):
+        record_rolling(username, port_val)
+
+    # O(log n) move on each board instead of rescanning every saved portfolio
+    with span('leaders.record'):
+        record_portfolio(username, port_val)
+    return port_val
+
+
+# Portfolio edits are valued here, off the request thread
+revaluations = RevaluationQueue(save_user_portfolio)
 
 
 # Base Route
-@app.route("/")
+@route("/")
 def hello_world():
     # If not logged in, route to welcome, else render dashboard 
     return redirect(url_for('welcome'))
 
-@app.route("/welcome")
+@route("/welcome")
 def welcome():
     return render_template('welcome.html')
 
 # Registers new user, adds them to MongoDB users 
-@app.route("/register", methods=['GET', 'POST'])
+@route("/register", methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
-        hashed_pswd = bcrypt.generate_password_hash(password).decode('utf-8')
-
-        user_data = {
-            'user': username,
-            'password': hashed_pswd,
-            'collection_of_stocks': [],
-            'allocations': [],
-            'portfolio_value': 10000
-        }
+        with span('bcrypt.hash'):
+            hashed_pswd = bcrypt.generate_password_hash(password).decode('utf-8')
 
-        test_collection.insert_one(user_data)
+        if not repository.create_user(username, hashed_pswd):
+            return 'That username is already taken.'
         return redirect(url_for('login'))
     return render_template('register.html')
 
 # Logs in users
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
-        user = test_collection.find_one({'user': username})
-        if user and bcrypt.check_password_hash(user['password'], password):
+        user = repository.get_credentials(username)
+        with span('bcrypt.check'):
+            password_ok = user is not None and bcrypt.check_password_hash(user['password'], password)
+        if password_ok:
             session['username'] = username
             return redirect(url_for('dashboard'))
         else: 
@@ -81,8 +201,11 @@ def login():
 
 # Provides a route to allow users to update their stock collection & allocations
 # TODO: Add login required wrapper around this thing
-@app.route('/update_portfolio', methods=['GET', 'POST'])
+@route('/update_portfolio', methods=['GET', 'POST'])
 def update_portfolio():
+    from portfolio_analysis.price_panel import DATA_DIR, get_price_panel
+    from portfolio_analysis.reference_data import reference_data
+
     if request.method == 'POST':
         username = session['username']
         portfolio_value = int(request.form['portfolio_value'])
@@ -96,7 +219,7 @@ def update_portfolio():
             stock = request.form.get(f'stock_{i}')
             allocation = request.form.get(f'allocation_{i}')
             if stock and allocation:
-                collection_of_stocks.append(stock)
+                collection_of_stocks.append(stock.strip().upper())
                 allocations.append(float(allocation))
 
         # Make sure that allocations sum up to 100%
@@ -104,29 +227,49 @@ def update_portfolio():
         if total_allocation != 100.0:
             return 'Allocations must sum up to 100%.'
 
+        # Turn bad input away here: the background valuation only logs its errors, and /league
+        # would then value the holdings itself and fail
+        unknown = [stock for stock in collection_of_stocks if stock not in reference_data.current().symbols]
+        if unknown:
+            return f"{', '.join(unknown)} not in the S&P 500."
+        # Some registry symbols have no price history at all; get_data can only read what the panel
+        # (or, before the first panel build, data/<SYMBOL>.csv) holds
+        panel = get_price_panel()
+        unpriced = [stock for stock in collection_of_stocks
+                    if not (stock in panel if panel is not None
+                            else os.path.exists(os.path.join(DATA_DIR, f"{stock}.csv")))]
+        if unpriced:
+            return f"No price history for {', '.join(unpriced)}."
+        if len(set(collection_of_stocks)) != len(collection_of_stocks):
+            return 'Each stock can only be listed once.'
+
         # Update the user data in MongoDB
-        test_collection.update_one(
-            {'user': username},
-            {'$set': {
-                'collection_of_stocks': collection_of_stocks,
-                'allocations': [float(a) for a in allocations],
-                'portfolio_value': portfolio_value
-            }}
-        )
+        repository.update_portfolio(username, collection_of_stocks, allocations, portfolio_value)
+
+        # Value the new allocations in the background; the series and leaderboard entries are
+        # usually in place before the user gets to /league, which waits for them if not
+        revaluations.submit(username, {
+            'collection_of_stocks': collection_of_stocks,
+            'allocations': allocations,
+            'portfolio_value': portfolio_value
+        })
         return redirect(url_for('dashboard'))
     return render_template('update_portfolio.html')
 
 
 # Dashboard Route
-@app.route("/dashboard", methods=['GET', 'POST'])
+@route("/dashboard", methods=['GET', 'POST'])
 def dashboard():
+    from portfolio_analysis.assess_portfolio import plot_solo_stock
+    from portfolio_analysis.reference_data import reference_data
+
     username = session['username']
     # Fetch user data
-    user = test_collection.find_one({'user': username})
+    user = repository.get_portfolio(username)
 
-    # Generate list of S&P 500 Stocks
-    sp500_dataFrame = pd.read_csv('sp500_symbols.csv')
-    sp500_symbols = sp500_dataFrame['Symbol'].tolist()
+    # List of S&P 500 Stocks, from the reference cache
+    reference = reference_data.current()
+    sp500_symbols = reference.symbol_list
     valid_stock = False
     # Information for Stock Stats
     stock_image = None
@@ -137,20 +280,20 @@ def dashboard():
     if request.method == 'POST':
         stock_selected = request.form['symbol'].upper()
         print(stock_selected)
-        if stock_selected in sp500_symbols:
+        if stock_selected in reference.symbols:
             valid_stock = True
 
-            # Retrieve Stock Data from MongoDB
-            stock_data = stock_metrics_collection.find_one({'stock_name': stock_selected})
+            # Retrieve Stock Data from the reference cache, falling back to MongoDB
+            stock_data = reference_data.stock_metrics().get(stock_selected)
+            if stock_data is None:
+                stock_data = repository.get_stock_metrics(stock_selected)
 
             if stock_data:
-                stock_data.pop('id', None)
-                stock_stats = stock_data
+                stock_stats = dict(stock_data)
+                stock_stats.pop('id', None)
 
-                # Get Graph Plot
-                plot_solo_stock(stock_selected)
-                image_path = f"{stock_selected}_returns.png"
-                stock_image = f'stock_graphs/{image_path}'
+                # Get Graph Plot, served from the render cache unless the prices changed
+                stock_image = plot_solo_stock(stock_selected)
             else:
                 flash(f"Data for {stock_selected} not found in database.")
         else:
@@ -160,17 +303,9 @@ def dashboard():
     return render_template('dashboard.html', user=user, sp500_symbols=sp500_symbols, stock_stats=stock_stats, valid_stock=valid_stock, stock_image=stock_image)
 
 # Tests Mongo_db connection, used for debugging
-@app.route("/mongo_test")
+@route("/mongo_test")
 def mongo_test():
-    user_data = {
-        'user': 'test_user_xxx',
-        'password': "abc123",
-        'collection_of_stocks': [],
-        'allocations': [],
-        'portfolio_value': 10000        
-    }
-
-    test_collection.insert_one(user_data)
+    repository.create_user('test_user_xxx', "abc123")
 
     try:
         client.admin.command('ping')
@@ -180,10 +315,20 @@ def mongo_test():
 
     return "<p>This should have added a user.</p>"
 
-@app.route("/league")
+# /league?window=1m swaps the weekly section for any trailing window (5d, 10d, 1m, 3m, ytd, all or e.g. 30d)
+@route("/league")
 def league():
+    from portfolio_analysis.assess_portfolio import (find_historical_leaders, find_window_leaders,
+                                                     user_portfolio_job, user_vs_top_three_historical_job,
+                                                     user_vs_top_three_weekly_job)
+    from portfolio_analysis.rolling import DEFAULT_WINDOW, WINDOWS, parse_window, window_title
+
     username = session.get('username')
-    user_data = test_collection.find_one({'user': username})
+    try:
+        window = parse_window(request.args.get('window'))
+    except ValueError as e:
+        return str(e), 400
+    user_data = repository.get_portfolio(username)
 
     print(f"The user is: {username}")
 
@@ -196,103 +341,149 @@ def league():
     # plot_user_vs_top_three_historical(username, top_three)
     # print("After: Calling find_recent_leaders")
 
-    allocs = user_data.get('allocations', [])
-    sv = user_data.get('portfolio_value', 0)
+    # An edit still being valued in the background finishes first, so this is a pure read
+    with span('revaluation.wait'):
+        revaluations.wait(username)
+    save_user_portfolio(username, user_data)
 
-    # print(f"symbols: {symbols}")
-    # print(f"allocs: {allocs}")
-    # print(f"sv: {sv}")
 
-    dates = pd.date_range('2024-08-01', '2024-09-27')
-    symbols = user_data.get('collection_of_stocks', [])
-    df_prices = get_data(symbols, dates)
-    print("Data:")
-    print(df_prices.head())
+    # RUNNING COMPARE TO WEEKLY (OR WINDOW) LEADERS AND PLOT THEM
+    top_three_weekly = find_window_leaders(username, window)
 
-    allocs = user_data.get('allocations', [])
-    allocs = [alloc / 100 for alloc in allocs]
-    sv = user_data.get('portfolio_value', 0)
+    # Charts render in the background; the page shows placeholders until each one is ready
+    image_filename_weekly, weekly_ready = render_service.submit(
+        user_vs_top_three_weekly_job(username, top_three_weekly, window))
 
-    port_val = get_portfolio_returns(df_prices, allocs, sv)
-    print(f"\nget_portfolio_returns() returns: \n{port_val.head(10)}")
 
-    directory = 'user_portfolios'
-    
-    filename = f"{session['username']}_portfolio.csv"
-    file_path = os.path.join(directory, filename)
+    # RUNNING COMPARE TO HISTORICAL LEADERS AND PLOT THEM
+    top_three_historical = find_historical_leaders(username)
 
-    print(f"The type of port_val: {type(port_val)}")
+    image_filename_historical, historical_ready = render_service.submit(
+        user_vs_top_three_historical_job(username, top_three_historical))
 
-    # port_val.to_csv(file_path, index=True)
-    # port_val.to_csv(file_path, index=True)
 
-    port_val_df = port_val.reset_index()
-    port_val_df.columns = ['Date', 'Portfolio']
-    port_val_df.to_csv(file_path, index=False)
+    # PLOT THE USER PORTFOLIO AND SAVE THE IMAGE
+    image_filename_personal, personal_ready = render_service.submit(user_portfolio_job(username))
 
+    pending_images = [filename for filename, ready in [(image_filename_weekly, weekly_ready),
+                                                       (image_filename_historical, historical_ready),
+                                                       (image_filename_personal, personal_ready)]
+                      if not ready]
 
-    # RUNNING COMPARE TO WEEKLY LEADERS AND PLOT THEM
-    print("Before: Calling find_recent_leaders")
-    top_three_weekly = find_weekly_leaders(username)
+    return render_template('league.html', username=username, weekly_image=image_filename_weekly,
+                           historical_image=image_filename_historical, personal_image=image_filename_personal,
+                           top_weekly=top_three_weekly, top_historical=top_three_historical,
+                           pending_images=pending_images, window=window, windows=list(WINDOWS),
+                           window_title=window_title(window), default_window=DEFAULT_WINDOW)
 
-    print(f"The type of top_three is: {type(top_three_weekly)}")
-    print(f"top_three is: {top_three_weekly}")
+# Polled by the league page's placeholders until their chart has been rendered
+@route("/render_status/<path:filename>")
+def render_status(filename):
+    if not filename.startswith('render_cache/') or '..' in filename:
+        return jsonify({'status': 'missing'}), 404
+    return jsonify({'status': render_service.status(filename)})
 
-    plot_user_vs_top_three_weekly(username, top_three_weekly)
-    print("After: Calling find_recent_leaders")
 
+# Ranks, percentiles and pages of the league as JSON, e.g. /league/rankings?board=weekly&offset=100&limit=50
+@route("/league/rankings")
+def league_rankings():
+    from portfolio_analysis.leaderboard import LEADERBOARDS, ensure_leaderboards_loaded
 
-    # Store the weekly image and display it to the frontend
-    image_filename_weekly = f"temp_graphs_weekly/{username}_vs_leaders.png"
+    board_name = request.args.get('board', 'historical')
+    if board_name not in LEADERBOARDS:
+        return jsonify({'error': f"Unknown board '{board_name}'"}), 400
 
-    # Check if the image exists before serving
-    image_static_path = 'static/' + image_filename_weekly
-    if os.path.exists(image_static_path):
-        print("Valid weekly image")
-    else:
-        return f"Image for {username} not found.", 404
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 10)), 0), MAX_RANKINGS_PAGE)
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+
+    ensure_leaderboards_loaded()
+    board = LEADERBOARDS[board_name]
+
+    entries = [{'rank': rank, 'user': user, 'normalized_return': normalized_return}
+               for rank, user, normalized_return in board.page(offset, limit)]
+
+    # Where the requested (or logged in) user stands, if they are on the board
+    username = request.args.get('user', session.get('username'))
+    standing = None
+    if username in board:
+        standing = {
+            'user': username,
+            'rank': board.rank(username),
+            'percentile': board.percentile(username),
+            'normalized_return': board.get(username)
+        }
 
+    return jsonify({'board': board_name, 'total': len(board), 'offset': offset,
+                    'entries': entries, 'user': standing})
 
-    # RUNNING COMPARE TO HISTORICAL LEADERS AND PLOT THEM
-    print("Before: Calling find_historical_leaders")
-    top_three_historical = find_historical_leaders(username)
+# Chart data as compact columnar JSON so the browser can draw it instead of the server.
+# Each series is {'days': [days since 1970-01-01], 'values': [...]}; ?points=N downsamples it.
+def requested_points():
+    points = request.args.get('points')
+    if points is None:
+        return None
+    return max(int(points), 1)
 
-    print(f"The type of top_three is: {type(top_three_historical)}")
-    print(f"top_three is: {top_three_historical}")
+@route("/api/stock/<symbol>/series")
+def api_stock_series(symbol):
+    from portfolio_analysis.series_api import stock_series
 
-    plot_user_vs_top_three_historical(username, top_three_historical)
-    print("After: Calling find_historical_leaders")
+    symbol = symbol.upper()
+    if not symbol.replace('.', '').replace('-', '').isalnum():
+        return jsonify({'error': f"Unknown symbol '{symbol}'"}), 404
+    try:
+        return jsonify(stock_series(symbol, requested_points()))
+    except (FileNotFoundError, KeyError):
+        return jsonify({'error': f"No price data for '{symbol}'"}), 404
+    except ValueError:
+        return jsonify({'error': 'points must be an integer'}), 400
+
+@route("/api/portfolio/<username>/series")
+def api_portfolio_series(username):
+    from portfolio_analysis.series_api import portfolio_series
+
+    if os.path.basename(username) != username or username.startswith('.'):
+        return jsonify({'error': f"Unknown user '{username}'"}), 404
+    try:
+        return jsonify(portfolio_series(username, requested_points()))
+    except KeyError:
+        return jsonify({'error': f"No portfolio saved for '{username}'"}), 404
+    except ValueError:
+        return jsonify({'error': 'points must be an integer'}), 400
+
+@route("/api/league/series")
+def api_league_series():
+    from portfolio_analysis.assess_portfolio import find_historical_leaders, find_window_leaders
+    from portfolio_analysis.leaderboard import LEADERBOARDS
+    from portfolio_analysis.rolling import parse_window
+    from portfolio_analysis.series_api import league_series
 
+    username = session.get('username')
+    board = request.args.get('board', 'historical')
+    if board not in LEADERBOARDS:
+        return jsonify({'error': f"Unknown board '{board}'"}), 400
 
-    # Store the historical image and display it to the frontend
-    image_filename_historical = f"temp_graphs/{username}_vs_leaders.png"
+    try:
+        window = parse_window(request.args.get('window'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    # Check if the image exists before serving
-    image_static_path = 'static/' + image_filename_historical
-    if os.path.exists(image_static_path):
-        print("Valid historical image")
+    if board == 'weekly':
+        top_three = find_window_leaders(username, window)
     else:
-        return f"Image for {username} not found.", 404
-
+        top_three = find_historical_leaders(username)
 
-    # PLOT THE USER PORTFOLIO AND SAVE THE IMAGE
-    # TODO: SEND TO TEMPLATE AND PLOT SPY IN THAT METHOD 
-    plot_user_portfolio(username)
-
-    # Store the personal image and display it to the frontend
-    image_filename_personal = f"user_portfolio_graphs/{username}_portfolio_graph.png"
-
-    # Check if the image exists before serving
-    image_static_path = 'static/' + image_filename_personal
-    if os.path.exists(image_static_path):
-        return render_template('league.html', username=username, weekly_image=image_filename_weekly,
-                               historical_image=image_filename_historical, personal_image=image_filename_personal,
-                               top_weekly=top_three_weekly, top_historical=top_three_historical)
-    else:
-        return f"Image for {username} not found.", 404
+    try:
+        return jsonify(league_series(username, top_three, board, requested_points(), window))
+    except KeyError:
+        return jsonify({'error': f"No portfolio saved for '{username}'"}), 404
+    except ValueError:
+        return jsonify({'error': 'points must be an integer'}), 400
 
-    
-@app.route('/portfolio_image')
+@route('/portfolio_image')
 def serve_image():
     print("IF YOU SEE THIS DEBUG STATEMENT, /portfolio_image is being hit, when it should not be.")
     username = session.get('username')
@@ -302,10 +493,14 @@ def serve_image():
     # Serve the image from the user portfolio directory
     return send_from_directory(GRAPH_DIR, image_filename)
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     # Clear the user session
     session.pop('username', None)
     # session.clear()
     # Redirect to the welcome page
-    return redirect(url_for('welcome'))
\ No newline at end of file
+    return redirect(url_for('welcome'))
+
+
+# gunicorn main:app; create_app() builds further apps (e.g. for tests) on the same routes
+app = create_app()
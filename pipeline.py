@@ -0,0 +1,310 @@
+"""End-of-day batch: new prices -> stock metrics -> every portfolio -> charts.
+
+    python pipeline.py                  # run (or resume) today's pipeline now
+    python pipeline.py --schedule       # wait for each weekday's close and run then
+
+Stages run as soon as the stages they depend on have finished, so independent ones
+(metrics, portfolios, stock charts) overlap. Each stage's outcome is written to the state
+file as it finishes; running again for the same date skips the stages already done, so a
+failed run picks up where it stopped.
+
+There is no leaderboard stage: the boards are derived from the portfolio store when read.
+Each web worker sees the portfolios stage's writes in the store's change log and reloads its
+own boards on the next request (see leaderboard.ensure_leaderboards_loaded).
+"""
+import argparse
+import datetime as dt
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from portfolio_analysis.repository import DB_NAME, MongoRepository, create_client
+
+load_dotenv()
+
+# Prices for the day are final a little after the close
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+RUN_AT = dt.time.fromisoformat(os.environ.get('PIPELINE_RUN_AT', '16:30'))
+# Where each run's progress is kept, for resuming
+STATE_FILE = os.environ.get('PIPELINE_STATE_FILE', 'pipeline_state.json')
+# First date ingest asks for; symbols already stored only fetch what comes after their last row
+PRICE_HISTORY_START = '2024-08-01'
+# Users whose league charts are drawn ahead of their first visit
+LEAGUE_CHART_USERS = int(os.environ.get('PIPELINE_LEAGUE_CHART_USERS', 100))
+# Processes drawing charts in the chart stages
+CHART_WORKERS = int(os.environ.get('PIPELINE_CHART_WORKERS', 2))
+
+DONE = 'done'
+FAILED = 'failed'
+
+Stage = namedtuple('Stage', ['name', 'after', 'run'])
+
+
+class PipelineRun:
+    """What every stage of one run needs: the trading date, the S&P 500 list, a price source and Mongo."""
+
+    def __init__(self, run_date, symbols, source, repository, workers=4, league_chart_users=LEAGUE_CHART_USERS,
+                 chart_workers=CHART_WORKERS):
+        self.run_date = run_date
+        self.symbols = symbols
+        self.source = source
+        self.repository = repository
+        self.workers = workers
+        self.league_chart_users = league_chart_users
+        self.chart_workers = chart_workers
+
+
+def ingest_stage(run):
+    from import_stock_data import BENCHMARK_SYMBOLS, refresh_prices
+
+    # The end date is exclusive, so this takes in the run date's own close
+    new_rows = refresh_prices(run.symbols + BENCHMARK_SYMBOLS, PRICE_HISTORY_START,
+                              run.run_date + dt.timedelta(days=1), run.source, workers=run.workers)
+    return {'symbols': len(new_rows), 'rows': sum(len(df) for df in new_rows.values())}
+
+
+def metrics_stage(run):
+    from calc_stats import compute_panel_metrics, publish_metrics
+
+    documents = compute_panel_metrics(run.symbols)
+    publish_metrics(run.repository, documents)
+    return {'symbols': len(documents)}
+
+
+def portfolios_stage(run):
+    from portfolio_analysis.assess_portfolio import portfolio_inputs, valuation_dates, value_user_portfolios
+    from portfolio_analysis.portfolio_store import get_portfolio_store
+
+    store = get_portfolio_store()
+    dates = valuation_dates()
+    users = run.repository.get_portfolios()
+
+    # Series already valued from these prices (an earlier attempt at this run) are left alone
+    stale = {username: user_data for username, user_data in users.items()
+             if not store.inputs_match(username, portfolio_inputs(user_data.get('collection_of_stocks', []),
+                                                                  user_data.get('allocations', []),
+                                                                  user_data.get('portfolio_value', 0), dates))}
+
+    valued = 0
+    for portfolios, inputs_by_user in value_user_portfolios(stale, dates):
+        # Saved with their inputs, so the app's next /league for each user is a pure read
+        store.replace_many(portfolios, inputs_by_user)
+        valued += len(portfolios.columns)
+    print(f"Revalued {valued} of {len(users)} portfolios through {dates[-1].date()}.")
+    return {'users': len(users), 'valued': valued, 'through': str(dates[-1].date())}
+
+
+def render_jobs(jobs, workers):
+    """Draw every job whose image is not already cached; returns (rendered, already cached)."""
+    from portfolio_analysis.render_cache import job_image_path, lookup, run_job
+
+    missing = [job for job in jobs if not lookup(job_image_path(job))]
+    if workers <= 0:
+        for job in missing:
+            run_job(job)
+    elif missing:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            list(executor.map(run_job, missing))
+    return len(missing), len(jobs) - len(missing)
+
+
+def stock_charts_stage(run):
+    from portfolio_analysis.assess_portfolio import solo_stock_job
+    from portfolio_analysis.price_panel import get_price_panel
+
+    panel = get_price_panel()
+    jobs = [solo_stock_job(symbol) for symbol in run.symbols if panel is None or symbol in panel]
+    rendered, cached = render_jobs(jobs, run.chart_workers)
+    print(f"Stock charts: {rendered} rendered, {cached} already cached.")
+    return {'rendered': rendered, 'cached': cached}
+
+
+def league_charts_stage(run):
+    from portfolio_analysis.assess_portfolio import (find_historical_leaders, find_window_leaders,
+                                                     user_portfolio_job, user_vs_top_three_historical_job,
+                                                     user_vs_top_three_weekly_job)
+    from portfolio_analysis.portfolio_store import get_portfolio_store
+
+    # The same three jobs /league submits, so each user's first visit after the close is a cache hit;
+    # the leaders come from boards loaded off the freshly revalued store, as a web worker's would
+    jobs = []
+    for username in get_portfolio_store().users[:run.league_chart_users]:
+        jobs.append(user_vs_top_three_weekly_job(username, find_window_leaders(username)))
+        jobs.append(user_vs_top_three_historical_job(username, find_historical_leaders(username)))
+        jobs.append(user_portfolio_job(username))
+    rendered, cached = render_jobs(jobs, run.chart_workers)
+    print(f"League charts: {rendered} rendered, {cached} already cached.")
+    return {'rendered': rendered, 'cached': cached}
+
+
+STAGES = [
+    Stage('ingest', [], ingest_stage),
+    Stage('metrics', ['ingest'], metrics_stage),
+    Stage('portfolios', ['ingest'], portfolios_stage),
+    Stage('stock_charts', ['ingest'], stock_charts_stage),
+    Stage('league_charts', ['portfolios'], league_charts_stage),
+]
+
+
+def load_state(run_date, path=STATE_FILE, restart=False):
+    """The saved state for run_date, or a fresh one if there is none (or it is for another date)."""
+    if not restart and os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('run_date') == str(run_date):
+            return state
+    return {'run_date': str(run_date), 'stages': {}}
+
+
+def save_state(state, path=STATE_FILE):
+    # Written aside and renamed, so a crash mid-write never loses the stages already done
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=2, default=str)
+    os.replace(temp_path, path)
+
+
+def _timed(stage, run):
+    start = time.perf_counter()
+    result = stage.run(run)
+    return result, time.perf_counter() - start
+
+
+def run_pipeline(run, stages=STAGES, state_path=STATE_FILE, restart=False, max_parallel=3):
+    """Run every stage not already done for run.run_date, each once its dependencies are; True if all finished."""
+    state = load_state(run.run_date, state_path, restart)
+    done = {name for name, record in state['stages'].items() if record['status'] == DONE}
+    if done:
+        print(f"Resuming the {run.run_date} run; already done: {', '.join(sorted(done))}.")
+
+    waiting = [stage for stage in stages if stage.name not in done]
+    failed = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while waiting or running:
+            for stage in list(waiting):
+                if any(name in failed for name in stage.after):
+                    # Blocked until a later attempt gets past the failure
+                    waiting.remove(stage)
+                    failed.add(stage.name)
+                elif all(name in done for name in stage.after):
+                    waiting.remove(stage)
+                    print(f"Starting {stage.name}...")
+                    state['stages'][stage.name] = {'status': 'running', 'started': dt.datetime.now().isoformat()}
+                    running[executor.submit(_timed, stage, run)] = stage
+            save_state(state, state_path)
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                record = state['stages'][stage.name]
+                record['finished'] = dt.datetime.now().isoformat()
+                try:
+                    record['result'], seconds = future.result()
+                    record['seconds'] = round(seconds, 3)
+                    record['status'] = DONE
+                    done.add(stage.name)
+                    print(f"Finished {stage.name} in {seconds:.1f}s.")
+                except Exception as e:
+                    record['status'] = FAILED
+                    record['error'] = f"{type(e).__name__}: {e}"
+                    failed.add(stage.name)
+                    print(f"{stage.name} failed: {e}")
+                    traceback.print_exc()
+        save_state(state, state_path)
+
+    if failed:
+        print(f"The {run.run_date} run stopped short of: {', '.join(sorted(failed))}. Run again to resume.")
+    return not failed
+
+
+def next_run_time(now):
+    """The next weekday at RUN_AT, market time, strictly after now."""
+    run_time = now.replace(hour=RUN_AT.hour, minute=RUN_AT.minute, second=0, microsecond=0)
+    if run_time <= now:
+        run_time += dt.timedelta(days=1)
+    while run_time.weekday() >= 5:
+        run_time += dt.timedelta(days=1)
+    return run_time
+
+
+def run_on_schedule(make_run, retry_minutes, state_path=STATE_FILE, max_parallel=3):
+    """Run after every weekday's close; a failed run is resumed every retry_minutes until the next close."""
+    while True:
+        run_time = next_run_time(dt.datetime.now(MARKET_TIMEZONE))
+        print(f"Next run at {run_time:%Y-%m-%d %H:%M %Z}.")
+        time.sleep(max((run_time - dt.datetime.now(MARKET_TIMEZONE)).total_seconds(), 0))
+
+        run = make_run(run_time.date())
+        next_close = next_run_time(run_time)
+        while not run_pipeline(run, state_path=state_path, max_parallel=max_parallel):
+            retry_at = dt.datetime.now(MARKET_TIMEZONE) + dt.timedelta(minutes=retry_minutes)
+            if retry_at >= next_close:
+                print(f"Giving up on the {run.run_date} run; the next one catches up on its prices.")
+                break
+            time.sleep(retry_minutes * 60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='Pipeline',
+        description='End-of-day batch: ingest prices, refresh stock metrics, revalue every portfolio '
+                    'and pre-render charts'
+    )
+    parser.add_argument('-d', '--date', action="store", dest="run_date",
+                        help="trading date to run for (default: today, market time)")
+    parser.add_argument('--source', choices=['yahoo', 'local'], default='yahoo', dest="source")
+    parser.add_argument('--source-dir', action="store", dest="source_dir",
+                        help="directory of <SYMBOL>.csv files for --source local")
+    parser.add_argument('-w', '--workers', type=int, default=4, dest="workers",
+                        help="concurrent fetch requests while ingesting")
+    parser.add_argument('-j', '--parallel', type=int, default=3, dest="parallel",
+                        help="stages allowed to run at once")
+    parser.add_argument('--chart-workers', type=int, default=CHART_WORKERS, dest="chart_workers",
+                        help="processes drawing charts (0 draws them in the pipeline itself)")
+    parser.add_argument('--league-charts', type=int, default=LEAGUE_CHART_USERS, dest="league_charts",
+                        help="users whose league charts are pre-rendered")
+    parser.add_argument('--state', action="store", default=STATE_FILE, dest="state_path")
+    parser.add_argument('--restart', action="store_true", dest="restart",
+                        help="run every stage again, even ones already done for this date")
+    parser.add_argument('--schedule', action="store_true", dest="schedule",
+                        help=f"keep running, once every weekday at {RUN_AT:%H:%M} New York time")
+    parser.add_argument('--retry-minutes', type=float, default=15, dest="retry_minutes",
+                        help="with --schedule, how long to wait before resuming a failed run")
+    args = parser.parse_args()
+
+    from import_stock_data import LocalFileSource, YahooSource
+
+    if args.source == 'local':
+        if not args.source_dir:
+            parser.error("--source local needs --source-dir")
+        source = LocalFileSource(args.source_dir)
+    else:
+        source = YahooSource()
+
+    symbols = pd.read_csv('sp500_symbols.csv')['Symbol'].tolist()
+    repository = MongoRepository(create_client()[DB_NAME])
+
+    def make_run(run_date):
+        return PipelineRun(run_date, symbols, source, repository, workers=args.workers,
+                           league_chart_users=args.league_charts, chart_workers=args.chart_workers)
+
+    if args.schedule:
+        run_on_schedule(make_run, args.retry_minutes, args.state_path, args.parallel)
+    else:
+        run_date = (dt.date.fromisoformat(args.run_date) if args.run_date
+                    else dt.datetime.now(MARKET_TIMEZONE).date())
+        ok = run_pipeline(make_run(run_date), state_path=args.state_path, restart=args.restart,
+                          max_parallel=args.parallel)
+        raise SystemExit(0 if ok else 1)
@@ -8,92 +8,175 @@ from matplotlib.ticker import MaxNLocator
 import math
 import os
 
-matplotlib.use('Agg')  # Set non-interactive backend
-
-def get_data(symbols, dates, path="data"):
-    df_final = pd.DataFrame(index=dates)
+from portfolio_analysis.leaderboard import ensure_leaderboards_loaded, historical_leaderboard, weekly_leaderboard
+from portfolio_analysis.portfolio_store import get_portfolio_store
+from portfolio_analysis.price_panel import DATA_DIR, get_price_panel, read_adj_close
+from portfolio_analysis.reference_data import reference_data
+from portfolio_analysis.render_cache import RenderJob, file_fingerprint, run_job
+from portfolio_analysis.rolling import DEFAULT_WINDOW, get_rolling_analytics, trailing, window_title
+from portfolio_analysis.tracing import traced
+from portfolio_analysis.valuation import build_allocation_matrix, value_portfolios
 
-    symbol = symbols[0]
-
-    file_path = os.path.join(path, f"{symbol}.csv")
+matplotlib.use('Agg')  # Set non-interactive backend
 
-    df_temp = pd.read_csv(file_path,
-                          index_col='Date',
-                          parse_dates=True,
-                          usecols=['Date', 'Adj Close'],
-                          na_values='NaN')
-    
-    df_temp = df_temp.rename(columns={'Adj Close': symbol})
-
-    df_final = df_final.join(df_temp, how="left")
-
-    for symbol in symbols[1:]:
-        file_path = os.path.join(path, f"{symbol}.csv")
-        df_temp = pd.read_csv(file_path,
-                              index_col='Date',
-                              parse_dates=True,
-                              usecols=['Date', 'Adj Close'],
-                              na_values='NaN')
-        df_temp = df_temp.rename(columns={'Adj Close': symbol})
-        df_final = df_final.join(df_temp, how='left')
+MISSING_POLICIES = ('drop', 'ffill', 'raise')
+
+# Saved portfolios are valued from here through the newest price in the panel
+VALUATION_START = '2024-08-01'
+# Where the window ends when there is no panel to read the newest date from
+VALUATION_END = '2024-09-27'
+# Bumped whenever get_portfolio_returns changes how it computes a series, so stored ones get redone
+VALUATION_METHOD = 2
+# Users valued per matmul by value_user_portfolios, to bound memory at 50k+ users
+VALUATION_CHUNK = 2000
+
+def valuation_dates():
+    panel = get_price_panel()
+    end = panel.dates[-1] if panel is not None and len(panel.dates) else VALUATION_END
+    return pd.date_range(VALUATION_START, end)
+
+@traced('prices.get_data')
+def get_data(symbols, dates, path=DATA_DIR, missing='drop'):
+    # missing decides what happens to a symbol with no price on a day others traded:
+    # 'drop' removes the day, 'ffill' carries the last price forward, 'raise' errors out
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"missing must be one of {MISSING_POLICIES}, got {missing!r}")
+
+    # Gather every symbol in one pass instead of joining them into the frame one at a time
+    panel = get_price_panel() if path == DATA_DIR else None
+    if panel is not None and all(symbol in panel for symbol in symbols):
+        df_final = panel.frame(symbols, dates)
+    else:
+        df_temps = [read_adj_close(symbol, path) for symbol in symbols]
+        df_final = pd.concat(df_temps, axis=1).reindex(dates)
+
+    # Days nothing traded on (weekends, holidays) are never part of a portfolio
+    df_final = df_final.dropna(how='all')
+
+    if missing == 'drop':
         df_final = df_final.dropna()
+    elif missing == 'ffill':
+        # Rows before a symbol's first price have nothing to fill from, so they still drop
+        df_final = df_final.ffill().dropna()
+    else:
+        incomplete = df_final.columns[df_final.isna().any()]
+        if len(incomplete) > 0:
+            raise ValueError(f"Missing prices for {', '.join(incomplete)} in the requested dates")
 
     return df_final
 
+@traced('valuation.portfolio_returns')
 def get_portfolio_returns(prices, allocations, start_val=10000):
-    
-    
-    stock_symbols = prices.columns.values
-    portfolio_by_symbol = {symbol: None for symbol in stock_symbols}
+    # Single-portfolio case of the batched engine: one row of allocations, one column of values,
+    # each holding rounded to a thousandth before summing as the saved values always were
+    values = value_portfolios(prices, [allocations], start_val, decimals=3)[:, 0]
 
-    # Stores each df in the dict, instead of making a temp one for each, so I can join them all at once,
-    # saving memory and increasing speed
-    for i in range(0, len(prices.columns)):
-        temp_df = prices[prices.columns[i]]
-        portfolio_by_symbol[stock_symbols[i]] = ((temp_df/temp_df[0]) * allocations[i] * start_val).round(3)
-
-    total_portfolio = pd.concat(portfolio_by_symbol.values(), axis=1)
-    total_portfolio = total_portfolio.sum(axis=1)
+    total_portfolio = pd.Series(values, index=prices.index)
     return total_portfolio
 
-def plot_user_portfolio(username):
+@traced('store.read_portfolio')
+def read_portfolio(username):
+    # A user's saved portfolio value series, indexed by date, out of the memory-mapped store
+    return get_portfolio_store().series(username)
+
+def price_data_fingerprint(symbol, path=DATA_DIR):
+    # Whatever file read_adj_close would read the symbol from decides whether its plot is stale
+    panel = get_price_panel() if path == DATA_DIR else None
+    if panel is not None and symbol in panel:
+        return panel.fingerprint
+    return file_fingerprint(os.path.join(path, f"{symbol}.csv"))
+
+def portfolio_inputs(symbols, allocations, start_val, dates):
+    # Everything get_data + get_portfolio_returns read, so an unchanged tuple means an unchanged series;
+    # the price fingerprints move with every panel generation (or CSV rewrite)
+    prices = tuple(dict.fromkeys(price_data_fingerprint(symbol) for symbol in symbols))
+    return (VALUATION_METHOD, tuple(symbols), tuple(float(a) for a in allocations), float(start_val),
+            str(dates[0].date()), str(dates[-1].date()), len(dates), prices)
+
+def value_user_portfolios(users, dates, chunk_size=VALUATION_CHUNK):
+    """Value many users' holdings the way save_user_portfolio does, a chunk at a time.
+
+    users is {username: user document}. Yields (dates x users DataFrame, {username: inputs}) per
+    chunk, ready for PortfolioStore.replace_many. Users with no holdings are left out. Values
+    match save_user_portfolio's up to the order the rounded holdings are summed in (~1e-12).
+    """
+    panel = get_price_panel()
+    # Symbols with a price on every trading day of the window: any portfolio made only of these
+    # keeps the same days under get_data's dropna, so one matmul values them all
+    complete = []
+    window = None
+    if panel is not None:
+        window = panel.frame(panel.symbols, dates).dropna(how='all')
+        if not window.empty:
+            complete = list(window.columns[window.notna().all().to_numpy()])
+            window = window[complete]
+    complete_set = set(complete)
+
+    names = [username for username, user_data in users.items() if user_data.get('collection_of_stocks')]
+    for start in range(0, len(names), chunk_size):
+        chunk = names[start:start + chunk_size]
+        inputs_by_user = {}
+        batched = []
+        columns = []
+        for username in chunk:
+            user_data = users[username]
+            symbols = user_data['collection_of_stocks']
+            allocs = user_data.get('allocations', [])
+            sv = user_data.get('portfolio_value', 0)
+            inputs_by_user[username] = portfolio_inputs(symbols, allocs, sv, dates)
+            if all(symbol in complete_set for symbol in symbols):
+                batched.append(username)
+                continue
+            # Gaps in the window (or no panel at all): value them one at a time, as the app would
+            try:
+                prices = get_data(symbols, dates)
+                columns.append(get_portfolio_returns(prices, [alloc / 100 for alloc in allocs], sv)
+                               .rename(username))
+            except Exception as e:
+                print(f"Valuing {username}'s portfolio failed: {e}")
+                del inputs_by_user[username]
+
+        if batched:
+            allocations = build_allocation_matrix(
+                [(users[username]['collection_of_stocks'], [alloc / 100 for alloc in users[username].get('allocations', [])])
+                 for username in batched], complete)
+            start_vals = [users[username].get('portfolio_value', 0) for username in batched]
+            values = value_portfolios(window, allocations, start_vals, decimals=3)
+            columns.insert(0, pd.DataFrame(values, index=window.index, columns=batched))
+        if columns:
+            yield pd.concat(columns, axis=1), inputs_by_user
+
+def league_plot_key_parts(username, top_three):
+    # Portfolios get rewritten on every league visit, so key on their content rather than a version
+    store = get_portfolio_store()
+    return tuple(store.fingerprint(user) for user in [username] + list(top_three))
+
+def _render_user_portfolio(username, image_path):
+    # Scope the poster style to this figure so it doesn't leak into later renders in the process
+    with plt.style.context('seaborn-v0_8-poster'):
+        _draw_user_portfolio(username, image_path)
+
+def _draw_user_portfolio(username, image_path):
     # Set up titles and labels
     title = f"{username}'s Portfolio vs Market (SPY)"
     xlabel = "Date"
     ylabel = "Normalized Portfolio Value"
     
-    # Define file paths
-    directory = 'user_portfolios'
-    filename = f"{username}_portfolio.csv"
-    file_path = f"{directory}/{filename}"
-
-    # Read the portfolio CSV file
-    df = pd.read_csv(file_path)
-
-    # Convert 'Date' column to datetime and set as index
-    df['Date'] = pd.to_datetime(df['Date'])
-    df.set_index('Date', inplace=True)
+    # Read the saved portfolio series from the store
+    df = read_portfolio(username).to_frame()
 
     # Normalize the portfolio values
     df['Portfolio_normalized'] = df['Portfolio'] / df['Portfolio'].iloc[0]
 
-    # Set the plot style
-    plt.style.use('seaborn-v0_8-poster')
-
     # Create a figure and axis object
     plt.figure(figsize=(12, 6))
 
     # Plot the normalized portfolio
     df['Portfolio_normalized'].plot(color='#1f77b4', linewidth=2, label='Portfolio')
 
-    # Read the SPY CSV, only keeps the Date and Adj Close cols
-    spy_df = pd.read_csv('data/SPY.csv', usecols=["Date", "Adj Close"])
-    spy_df['Date'] = pd.to_datetime(spy_df['Date'])
-    spy_df.set_index('Date', inplace=True)
-
-    # Normalize the portfolio values and plot it
-    spy_df['SPY_normalized'] = spy_df['Adj Close'] / spy_df['Adj Close'].iloc[0]
-    spy_df['SPY_normalized'].plot(color='red', linewidth=2, label='SPY', linestyle='--')
+    # SPY comes pre-normalized from the reference data loaded once per process
+    spy_normalized = reference_data.current().spy_normalized
+    spy_normalized.plot(color='red', linewidth=2, label='SPY', linestyle='--')
 
 
     # Set title and labels with increased font sizes
@@ -113,104 +196,66 @@ def plot_user_portfolio(username):
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
     plt.tight_layout()
 
-    # Save the plot to a file
-    image_directory = 'static/user_portfolio_graphs'
-    if not os.path.exists(image_directory):
-        os.makedirs(image_directory)
-    image_path = f"{image_directory}/{username}_portfolio_graph.png"
-    plt.savefig(image_path)
+    # Save the plot to the path the render cache handed us
+    plt.savefig(image_path, format='png')
     plt.close()
     print(f"{username} Portfolio vs SPY Graph saved in: {image_path}")
 
-def plot_solo_stock(symbol):
+def user_portfolio_job(username):
+    # Only re-render when the user's saved series or SPY's prices changed since the cached image
+    key_parts = (username,
+                 get_portfolio_store().fingerprint(username),
+                 price_data_fingerprint('SPY'))
+    return RenderJob('portfolio', key_parts, _render_user_portfolio, (username,))
+
+def plot_user_portfolio(username):
+    return run_job(user_portfolio_job(username))
+
+def _render_solo_stock(symbol, image_path):
     # Set up titles and labels
     title = f"{symbol}'s Historical Performance"
     xlabel = "Date"
     ylabel = "Stock Value"
     
-    # Define file paths
-    file_path = f'data/{symbol}.csv'
-
-    # Read the stock CSV, only keeps the Date and Adj Close cols
-    df = pd.read_csv(file_path, usecols=["Date", "Adj Close"])
-
-    # Convert 'Date' column to datetime and set as index
-    df['Date'] = pd.to_datetime(df['Date'])
-    df.set_index('Date', inplace=True)
+    # Read the stock's Date and Adj Close, from the price panel if it has been built
+    df = read_adj_close(symbol).rename(columns={symbol: 'Adj Close'})
 
     # Plot the 'Adj Close' prices
     plt.figure(figsize=(10,6))
     df['Adj Close'].plot(title=title, xlabel=xlabel, ylabel=ylabel)
     plt.grid(True)
 
-    # Save the plot to a file
-    image_directory = 'static/stock_graphs'
-    if not os.path.exists(image_directory):
-        os.makedirs(image_directory)
-    image_path = f"{image_directory}/{symbol}_returns.png"
-    plt.savefig(image_path)
+    # Save the plot to the path the render cache handed us
+    plt.savefig(image_path, format='png')
     plt.close()
     print(f"Graphed and saved stock graph of {symbol}.")
 
-def find_historical_leaders(username):
-    # Directory containing the user portfolios
-    directory = 'user_portfolios'
-
-    portfolio_returns = []
-
-    # Loop through each CSV file in the directory
-    for filename in os.listdir(directory):
-        if filename.endswith('.csv'):
-            user = filename.replace('_portfolio.csv', '')
-
-            # Skip the portfolio of the current session user
-            if user == username:
-                continue
-
-            # Load the CSV file into a DataFrame
-            df = pd.read_csv(os.path.join(directory, filename), usecols=["Date", "Portfolio"])
+def solo_stock_job(symbol):
+    # Only re-render when the symbol's price data changed since the cached image was drawn
+    key_parts = (symbol, price_data_fingerprint(symbol))
+    return RenderJob('stock', key_parts, _render_solo_stock, (symbol,))
 
-            # Convert 'Date' column to datetime and set as index
-            df['Date'] = pd.to_datetime(df['Date'])
-            df.set_index('Date', inplace=True)
-
-            # Calculate the normalized return as (last value / first value)
-            first_value = df['Portfolio'].iloc[0]
-            last_value = df['Portfolio'].iloc[-1]
-            normalized_return = last_value / first_value
-            print(f"The normalized return of {user} is {normalized_return}")
-
-
-            # Store the user and their portfolio difference
-            portfolio_returns.append({'user': user, 'normalized_return': normalized_return})
-    
-    print(f"at the end, portfolio_returns looks like: {portfolio_returns}")
+def plot_solo_stock(symbol):
+    return run_job(solo_stock_job(symbol))
 
-    # Convert the list to a DataFrame for easier sorting
-    portfolio_returns_df = pd.DataFrame(portfolio_returns)
-    top_three_portfolios = portfolio_returns_df.sort_values(by='normalized_return', ascending=False).head(3)
+@traced('leaders.historical')
+def find_historical_leaders(username):
+    # Read the top three straight off the in-memory board instead of rescanning every portfolio
+    ensure_leaderboards_loaded()
+    leaders = historical_leaderboard.top(3, exclude=username)
 
-    # Convert df to a dict for passage into plotting method:
-    top_three_portfolios = top_three_portfolios.set_index('user').to_dict(orient='index')
+    # Same shape as before for the plotting method: {user: {'normalized_return': value}}
+    top_three_portfolios = {user: {'normalized_return': normalized_return}
+                            for user, normalized_return in leaders}
 
-    print(f"The type of top_three_portfolios is: {type(top_three_portfolios)}")
-    print(top_three_portfolios)
-    print("\n\n\n\n")
+    print(f"Historical leaders: {top_three_portfolios}")
     return top_three_portfolios
 
-def plot_user_vs_top_three_historical(username, top_three):
-    directory = 'user_portfolios'
-
+def _render_user_vs_top_three_historical(username, top_three, image_path):
     print(f"Username: {username} ")
 
-    # Load current user's portfolio
-    user_file = f'{directory}/{username}_portfolio.csv'
-
-    print(f"user_file: {user_file}")
-
-    user_df = pd.read_csv(user_file, usecols=["Date", "Portfolio"])
-    user_df['Date'] = pd.to_datetime(user_df['Date'])
-    user_df.set_index('Date', inplace=True)
+    # Load current user's portfolio from the store
+    user_df = read_portfolio(username).to_frame()
 
     # Normalize the user's portfolio returns
     user_df['Normalized'] = user_df['Portfolio'] / user_df['Portfolio'].iloc[0]
@@ -224,14 +269,8 @@ def plot_user_vs_top_three_historical(username, top_three):
     for top_user, user_data in top_three.items():
         print(f"top_user: {top_user}")
         
-        # Construct the file name directly using an f-string
-        top_user_file = f'{directory}/{top_user}_portfolio.csv'
-        print(f"top_user_file: {top_user_file}")
-        
-        # Load the top user's portfolio data
-        top_user_df = pd.read_csv(top_user_file, usecols=["Date", "Portfolio"])
-        top_user_df['Date'] = pd.to_datetime(top_user_df['Date'])
-        top_user_df.set_index('Date', inplace=True)
+        # Load the top user's portfolio data from the store
+        top_user_df = read_portfolio(top_user).to_frame()
 
         # Normalize the top user's portfolio returns
         top_user_df['Normalized'] = top_user_df['Portfolio'] / top_user_df['Portfolio'].iloc[0]
@@ -256,80 +295,58 @@ def plot_user_vs_top_three_historical(username, top_three):
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
     plt.tight_layout()
 
-    # Show the plot
-    # Save the plot to a file
-    image_directory = 'static/temp_graphs'
-    if not os.path.exists(image_directory):
-        os.makedirs(image_directory)
-    image_path = f"{image_directory}/{username}_vs_leaders.png"
-    plt.savefig(image_path)
+    # Save the plot to the path the render cache handed us
+    plt.savefig(image_path, format='png')
     plt.close()
     print(f"Graphed and saved stock graph of {username} vs top three leaders.")
 
+def user_vs_top_three_historical_job(username, top_three):
+    # Only re-render when any plotted user's saved series changed since the cached image
+    key_parts = league_plot_key_parts(username, top_three)
+    return RenderJob('historical', key_parts, _render_user_vs_top_three_historical, (username, top_three))
 
-def find_weekly_leaders(username):
-    # Directory containing the user portfolios
-    directory = 'user_portfolios'
-    portfolio_returns = []
-
-    # Loop through each CSV file in the directory
-    for filename in os.listdir(directory):
-        if filename.endswith('.csv'):
-            user = filename.replace('_portfolio.csv', '')
-
-            # Skip the portfolio of the current session user
-            if user == username:
-                continue
+def plot_user_vs_top_three_historical(username, top_three):
+    return run_job(user_vs_top_three_historical_job(username, top_three))
 
-            # Load the CSV file into a DataFrame
-            df = pd.read_csv(os.path.join(directory, filename), usecols=["Date", "Portfolio"])
 
-            # Convert 'Date' column to datetime and set as index
-            df['Date'] = pd.to_datetime(df['Date'])
-            df.set_index('Date', inplace=True)
+@traced('leaders.weekly')
+def find_weekly_leaders(username):
+    # The weekly board scores each user on their last two workweeks (see leaderboard.WEEKLY_DAYS)
+    ensure_leaderboards_loaded()
+    leaders = weekly_leaderboard.top(3, exclude=username)
 
-            # Drop all rows except the last 10 (last two workweeks)
-            df = df.tail(10)
+    # Same shape as before for the plotting method: {user: {'normalized_return': value}}
+    top_three_portfolios = {user: {'normalized_return': normalized_return}
+                            for user, normalized_return in leaders}
 
-            # Calculate the normalized return as (last value / first value) of the remaining 10 rows
-            first_value = df['Portfolio'].iloc[0]
-            last_value = df['Portfolio'].iloc[-1]
-            normalized_return = last_value / first_value
-            print(f"The normalized return of {user} for the last two workweeks is {normalized_return}")
+    print(f"Weekly leaders: {top_three_portfolios}")
+    return top_three_portfolios
 
-            # Store the user and their portfolio difference
-            portfolio_returns.append({'user': user, 'normalized_return': normalized_return})
-    
-    print(f"At the end, portfolio_returns looks like: {portfolio_returns}")
+@traced('leaders.window')
+def find_window_leaders(username, window=DEFAULT_WINDOW):
+    # Any trailing window (see rolling.WINDOWS); the default one is the weekly board itself
+    if window == DEFAULT_WINDOW:
+        return find_weekly_leaders(username)
 
-    # Convert the list to a DataFrame for easier sorting
-    portfolio_returns_df = pd.DataFrame(portfolio_returns)
-    top_three_portfolios = portfolio_returns_df.sort_values(by='normalized_return', ascending=False).head(3)
+    leaders = get_rolling_analytics().top(window, 3, exclude=username)
 
-    # Convert df to a dict for passage into plotting method
-    top_three_portfolios = top_three_portfolios.set_index('user').to_dict(orient='index')
+    # Same shape as the weekly leaders, plus the window's risk numbers for the cards
+    top_three_portfolios = {user: {'normalized_return': normalized_return,
+                                   'volatility': volatility,
+                                   'sharpe_ratio': sharpe_ratio}
+                            for user, normalized_return, volatility, sharpe_ratio in leaders}
 
-    print(f"The type of top_three_portfolios is: {type(top_three_portfolios)}")
-    print(top_three_portfolios)
-    print("\n\n\n\n")
+    print(f"Leaders over {window}: {top_three_portfolios}")
     return top_three_portfolios
 
-def plot_user_vs_top_three_weekly(username, top_three):
-    directory = 'user_portfolios'
-
+def _render_user_vs_top_three_weekly(username, top_three, window, image_path):
     print(f"Username: {username} ")
 
-    # Load current user's portfolio
-    user_file = f'{directory}/{username}_portfolio.csv'
+    # Load current user's portfolio from the store
+    user_df = read_portfolio(username).to_frame()
 
-    print(f"user_file: {user_file}")
-
-    user_df = pd.read_csv(user_file, usecols=["Date", "Portfolio"])
-    user_df['Date'] = pd.to_datetime(user_df['Date'])
-    user_df.set_index('Date', inplace=True)
-
-    # Drop all rows except the last 10 (last two workweeks)
-    user_df = user_df.tail(10)
+    # Drop all rows outside the window (by default the last 10, i.e. last two workweeks)
+    user_df = trailing(user_df['Portfolio'], window).to_frame()
 
     # Normalize the user's portfolio returns
     user_df['Normalized'] = user_df['Portfolio'] / user_df['Portfolio'].iloc[0]
@@ -345,17 +362,11 @@ def plot_user_vs_top_three_weekly(username, top_three):
     for top_user, user_data in top_three.items():
         print(f"top_user: {top_user}")
         
-        # Construct the file name directly using an f-string
-        top_user_file = f'{directory}/{top_user}_portfolio.csv'
-        print(f"top_user_file: {top_user_file}")
-        
-        # Load the top user's portfolio data
-        top_user_df = pd.read_csv(top_user_file, usecols=["Date", "Portfolio"])
-        top_user_df['Date'] = pd.to_datetime(top_user_df['Date'])
-        top_user_df.set_index('Date', inplace=True)
+        # Load the top user's portfolio data from the store
+        top_user_df = read_portfolio(top_user).to_frame()
 
-        # Drop all rows except the last 10 (last two workweeks)
-        top_user_df = top_user_df.tail(10)
+        # Drop all rows outside the window
+        top_user_df = trailing(top_user_df['Portfolio'], window).to_frame()
 
         # Normalize the top user's portfolio returns
         top_user_df['Normalized'] = top_user_df['Portfolio'] / top_user_df['Portfolio'].iloc[0]
@@ -367,11 +378,16 @@ def plot_user_vs_top_three_weekly(username, top_three):
         plt.plot(top_user_df['Date_Str'], top_user_df['Normalized'], label=top_user, linestyle='--')
 
     # Adding titles and labels
-    plt.title('League Leaders: Best Weekly Portfolios', fontsize=16)
+    if window == DEFAULT_WINDOW:
+        plt.title('League Leaders: Best Weekly Portfolios', fontsize=16)
+    else:
+        plt.title(f'League Leaders: Best Portfolios, {window_title(window)}', fontsize=16)
     plt.xlabel('Date', fontsize=12)
     plt.ylabel('(Normalized) Portfolio Value', fontsize=12)
 
     plt.xticks(rotation=45)  # Rotate date labels for better fit
+    # Long windows would otherwise label every single trading day
+    plt.gca().xaxis.set_major_locator(MaxNLocator(nbins=12))
 
     plt.legend(loc='best')
 
@@ -379,11 +395,16 @@ def plot_user_vs_top_three_weekly(username, top_three):
     plt.grid(True, which='both', linestyle='--', linewidth=0.5)
     plt.tight_layout()
 
-    # Save the plot to a file
-    image_directory = 'static/temp_graphs_weekly'
-    if not os.path.exists(image_directory):
-        os.makedirs(image_directory)
-    image_path = f"{image_directory}/{username}_vs_leaders.png"
-    plt.savefig(image_path)
+    # Save the plot to the path the render cache handed us
+    plt.savefig(image_path, format='png')
     plt.close()
-    print(f"Graphed and saved stock graph of {username} vs top three leaders for the last two workweeks.")
+    print(f"Graphed and saved stock graph of {username} vs top three leaders over {window}.")
+
+def user_vs_top_three_weekly_job(username, top_three, window=DEFAULT_WINDOW):
+    # Only re-render when any plotted user's saved series changed since the cached image
+    key_parts = (window,) + league_plot_key_parts(username, top_three)
+    return RenderJob('weekly', key_parts, _render_user_vs_top_three_weekly, (username, top_three, window))
+
+def plot_user_vs_top_three_weekly(username, top_three, window=DEFAULT_WINDOW):
+    return run_job(user_vs_top_three_weekly_job(username, top_three, window))
+
@@ -0,0 +1,332 @@
+import math
+import random
+import threading
+
+import numpy as np
+
+from portfolio_analysis.portfolio_store import get_portfolio_store
+from portfolio_analysis.tracing import traced
+
+# The weekly board looks at the last two workweeks of trading
+WEEKLY_DAYS = 10
+
+
+class _Node:
+    __slots__ = ('key', 'priority', 'size', 'left', 'right')
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+
+
+def _size(node):
+    return node.size if node is not None else 0
+
+
+def _resize(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _split(node, key):
+    # Split into (keys < key, keys >= key)
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        _resize(node)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    _resize(node)
+    return left, node
+
+
+def _merge(left, right):
+    # Every key in left must sort before every key in right
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _resize(left)
+        return left
+    right.left = _merge(left, right.left)
+    _resize(right)
+    return right
+
+
+def _delete(node, key):
+    if node.key == key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _delete(node.left, key)
+    else:
+        node.right = _delete(node.right, key)
+    _resize(node)
+    return node
+
+
+def _build(keys):
+    # Treap over already sorted keys in O(n): each node pops the lower-priority nodes before it
+    # off the right spine and adopts the last one popped as its left child
+    spine = []
+    for key in keys:
+        node = _Node(key)
+        last = None
+        while spine and spine[-1].priority < node.priority:
+            last = spine.pop()
+            _resize(last)
+        node.left = last
+        if spine:
+            spine[-1].right = node
+        spine.append(node)
+    while len(spine) > 1:
+        _resize(spine.pop())
+    if not spine:
+        return None
+    _resize(spine[0])
+    return spine[0]
+
+
+class _RankTree:
+    """Treap with subtree sizes: insert, delete, rank and positional lookup in O(log n)."""
+
+    def __init__(self, sorted_keys=()):
+        self.root = _build(sorted_keys)
+
+    def __len__(self):
+        return _size(self.root)
+
+    def insert(self, key):
+        left, right = _split(self.root, key)
+        self.root = _merge(_merge(left, _Node(key)), right)
+
+    def delete(self, key):
+        self.root = _delete(self.root, key)
+
+    def rank(self, key):
+        """Number of keys that sort before key."""
+        count = 0
+        node = self.root
+        while node is not None:
+            if key <= node.key:
+                node = node.left
+            else:
+                count += _size(node.left) + 1
+                node = node.right
+        return count
+
+    def iter_from(self, position):
+        """Yield keys in order, starting at the given 0-based position."""
+        stack = []
+        node = self.root
+        while node is not None:
+            left_size = _size(node.left)
+            if position < left_size:
+                stack.append(node)
+                node = node.left
+            elif position == left_size:
+                stack.append(node)
+                break
+            else:
+                position -= left_size + 1
+                node = node.right
+
+        while stack:
+            node = stack.pop()
+            yield node.key
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+
+
+class Leaderboard:
+    """Users ordered by normalized return, with rank queries in logarithmic time."""
+
+    def __init__(self):
+        # Keys are (-normalized_return, user) so the best return sorts first and ties break by name
+        self._tree = _RankTree()
+        self._returns = {}
+        # Requests update the board from several threads; the tree must not be rebalanced mid-read
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._returns)
+
+    def __contains__(self, user):
+        return user in self._returns
+
+    def get(self, user):
+        return self._returns.get(user)
+
+    def update(self, user, normalized_return):
+        """Insert or move a user; a non-finite return just takes them off the board."""
+        with self._lock:
+            self.remove(user)
+            if not math.isfinite(normalized_return):
+                return
+            self._returns[user] = normalized_return
+            self._tree.insert((-normalized_return, user))
+
+    def remove(self, user):
+        with self._lock:
+            normalized_return = self._returns.pop(user, None)
+            if normalized_return is None:
+                return
+            self._tree.delete((-normalized_return, user))
+
+    def clear(self):
+        with self._lock:
+            self._tree = _RankTree()
+            self._returns = {}
+
+    def load(self, returns_by_user):
+        """Replace the whole board in one O(n log n) sort; non-finite returns are left off."""
+        returns = {user: float(normalized_return) for user, normalized_return in returns_by_user.items()
+                   if math.isfinite(normalized_return)}
+        tree = _RankTree(sorted((-normalized_return, user) for user, normalized_return in returns.items()))
+        with self._lock:
+            self._tree = tree
+            self._returns = returns
+
+    def rank(self, user):
+        """1-based rank of a user, or None if they are not on the board."""
+        with self._lock:
+            normalized_return = self._returns.get(user)
+            if normalized_return is None:
+                return None
+            return self._tree.rank((-normalized_return, user)) + 1
+
+    def percentile(self, user):
+        """Share of the board (in %) ranked at or below the user; the leader is at 100."""
+        with self._lock:
+            rank = self.rank(user)
+            if rank is None:
+                return None
+            return 100.0 * (len(self) - rank + 1) / len(self)
+
+    def page(self, offset, limit):
+        """Return (rank, user, normalized_return) for ranks offset+1 .. offset+limit."""
+        entries = []
+        with self._lock:
+            for negative_return, user in self._tree.iter_from(offset):
+                if len(entries) == limit:
+                    break
+                entries.append((offset + len(entries) + 1, user, -negative_return))
+        return entries
+
+    def top(self, k, exclude=None):
+        """Return the best k (user, normalized_return) pairs, skipping the excluded user."""
+        leaders = []
+        with self._lock:
+            for negative_return, user in self._tree.iter_from(0):
+                if len(leaders) == k:
+                    break
+                if user == exclude:
+                    continue
+                leaders.append((user, -negative_return))
+        return leaders
+
+
+historical_leaderboard = Leaderboard()
+weekly_leaderboard = Leaderboard()
+LEADERBOARDS = {'historical': historical_leaderboard, 'weekly': weekly_leaderboard}
+# Store version the boards reflect; None until the first load
+_loaded_version = None
+_load_lock = threading.Lock()
+
+
+def record_portfolio(user, portfolio):
+    """Update both boards from a user's portfolio value Series."""
+    historical_return = portfolio.iloc[-1] / portfolio.iloc[0]
+    recent = portfolio.tail(WEEKLY_DAYS)
+    weekly_return = recent.iloc[-1] / recent.iloc[0]
+
+    historical_leaderboard.update(user, float(historical_return))
+    weekly_leaderboard.update(user, float(weekly_return))
+
+
+def board_returns(portfolios, weekly_days=WEEKLY_DAYS):
+    """(historical, weekly) normalized returns for every column of a dates x users frame.
+
+    Same numbers as record_portfolio on each column's non-NaN values: last over first, and last
+    over the weekly_days-th value from the end. Users with no values get NaN.
+    """
+    values = portfolios.to_numpy(dtype=np.float64)
+    historical = np.full(values.shape[1], np.nan)
+    weekly = np.full(values.shape[1], np.nan)
+    if values.size == 0:
+        return historical, weekly
+
+    valid = np.isfinite(values)
+    # How many valid values each cell has at or after it, so they can be picked counting from the end
+    from_end = np.cumsum(valid[::-1], axis=0)[::-1]
+    counts = from_end[0]
+    columns = np.arange(values.shape[1])
+
+    def nth_from_end(n):
+        return values[np.argmax(valid & (from_end == n), axis=0), columns]
+
+    stored = counts > 0
+    last = nth_from_end(1)[stored]
+    historical[stored] = last / nth_from_end(counts)[stored]
+    weekly[stored] = last / nth_from_end(np.minimum(counts, weekly_days))[stored]
+    return historical, weekly
+
+
+def remove_portfolio(user):
+    historical_leaderboard.remove(user)
+    weekly_leaderboard.remove(user)
+
+
+@traced('leaders.load')
+def load_leaderboards(store=None):
+    """Rebuild both boards from the portfolio store, e.g. at startup or after a price refresh."""
+    global _loaded_version
+
+    if store is None:
+        store = get_portfolio_store()
+
+    version = store.version
+    # One copy of the whole matrix out of the map, then every user's returns in one pass
+    portfolios = store.frame()
+    historical, weekly = board_returns(portfolios)
+    users = [str(user) for user in portfolios.columns]
+    historical_leaderboard.load(dict(zip(users, historical)))
+    weekly_leaderboard.load(dict(zip(users, weekly)))
+
+    _loaded_version = version
+    print(f"Loaded {len(historical_leaderboard)} portfolios into the leaderboards.")
+
+
+def ensure_leaderboards_loaded(store=None):
+    """Load the boards on first use, then keep them in step with writes from any process.
+
+    Users written since the boards were last brought up to date are re-read one by one; only a
+    write too big for the store's change log (a bulk revaluation) costs a full reload.
+    """
+    global _loaded_version
+
+    if store is None:
+        store = get_portfolio_store()
+    with _load_lock:
+        if _loaded_version is None:
+            load_leaderboards(store)
+            return
+        version, changed = store.changed_since(_loaded_version)
+        if changed is None:
+            load_leaderboards(store)
+            return
+        for user in changed:
+            portfolio = store.series(user) if user in store else None
+            if portfolio is None or portfolio.empty:
+                remove_portfolio(user)
+            else:
+                record_portfolio(user, portfolio)
+        _loaded_version = version
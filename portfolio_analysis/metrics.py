@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Column names match the fields of a stock_metrics document in MongoDB
+METRIC_COLUMNS = ['Cumulative Return', 'Avg. Daily Return', 'Volatility', 'Sharpe Ratio', 'Sortino Ratio']
+
+
+def masked_mean_std(values, mask):
+    # Column-wise mean and sample std (ddof=1) over the entries where mask is True;
+    # NaN std below two entries, as pandas gives
+    count = mask.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(mask, values, 0.0).sum(axis=0) / count
+        deviations = np.where(mask, values - mean, 0.0)
+        std = np.where(count > 1, np.sqrt((deviations ** 2).sum(axis=0) / (count - 1)), np.nan)
+    return mean, std
+
+
+def cross_sectional_metrics(prices):
+    """Every metric for every symbol from a dates x symbols price DataFrame, in a few reductions.
+
+    Matches calc_stats.calculate_metrics column by column: simple daily returns, sample
+    standard deviations, a risk-free rate of 0, and Sortino over the negative days only.
+    """
+    values = prices.to_numpy(dtype=np.float64)
+
+    # Cumulative return between each symbol's first and last available price
+    has_price = np.isfinite(values)
+    first_row = has_price.argmax(axis=0)
+    last_row = len(values) - 1 - has_price[::-1].argmax(axis=0)
+    columns = np.arange(values.shape[1])
+    first_price = values[first_row, columns]
+    last_price = values[last_row, columns]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cumulative_return = (last_price - first_price) / first_price
+        daily_returns = values[1:] / values[:-1] - 1
+
+    has_return = np.isfinite(daily_returns)
+    avg_daily_return, volatility = masked_mean_std(daily_returns, has_return)
+
+    # Downside deviation through a mask instead of a filtered copy per symbol
+    _, downside_volatility = masked_mean_std(daily_returns, has_return & (daily_returns < 0))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe_ratio = np.where(volatility != 0, avg_daily_return / volatility, 0.0)
+        sortino_ratio = np.where(downside_volatility != 0, avg_daily_return / downside_volatility, 0.0)
+
+    table = pd.DataFrame({
+        'Cumulative Return': cumulative_return,
+        'Avg. Daily Return': avg_daily_return,
+        'Volatility': volatility,
+        'Sharpe Ratio': sharpe_ratio,
+        'Sortino Ratio': sortino_ratio,
+    }, index=pd.Index(prices.columns, name='stock_name'))
+    return table.round(4)
+
+
+def metrics_documents(table):
+    """One stock_metrics document per row of a metrics table."""
+    documents = []
+    for symbol, row in zip(table.index, table.to_numpy()):
+        document = {'stock_name': symbol}
+        document.update({column: float(value) for column, value in zip(METRIC_COLUMNS, row)})
+        documents.append(document)
+    return documents
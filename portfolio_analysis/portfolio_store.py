@@ -0,0 +1,365 @@
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process write lock on Windows; the in-process lock still applies
+    fcntl = None
+
+STORE_DIR = 'portfolio_store'
+# Where portfolio series lived before the store; imported into it the first time it is opened
+PORTFOLIO_DIR = 'user_portfolios'
+META_FILE = 'meta.json'
+LOCK_FILE = '.lock'
+# One fixed-size digest of each user's valuation inputs, in the same row order as the values
+INPUTS_FILE = 'inputs.bin'
+INPUTS_DIGEST_BYTES = 16
+# Date slots reserved per user up front; doubled whenever the date axis outgrows it
+INITIAL_DATE_CAPACITY = 64
+# meta.json lists the users each of the last CHANGE_LOG_VERSIONS writes touched, so readers holding
+# something derived from the store can catch up user by user; bigger writes just say "reload"
+CHANGE_LOG_VERSIONS = 256
+CHANGE_LOG_MAX_USERS = 1000
+
+# One consistent view of the store: readers grab it once, writers swap in a new one
+_StoreState = namedtuple('_StoreState', ['users', 'rows', 'dates', 'capacity', 'generation', 'version',
+                                         'values', 'stamp', 'changes'])
+
+# Opened stores, keyed by store directory, so each process maps the files only once
+_stores = {}
+
+
+def _meta_stamp(meta_path):
+    # os.replace gives meta.json a new inode on every write, so this changes even within one mtime tick
+    try:
+        stat = os.stat(meta_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+class PortfolioStore:
+    """Every user's portfolio value series in one users x dates float64 matrix on a shared date axis.
+
+    The matrix is a raw file, memory-mapped for reads. Each user owns one row with room for
+    `capacity` dates, so replacing a user rewrites only that row, appending a day writes one
+    column, and adding a user appends one row; only outgrowing the date capacity rewrites the
+    file. meta.json (users, dates, capacity) is replaced atomically after every write and tells
+    other processes to re-map.
+
+    Next to each row, inputs.bin keeps a digest of whatever the series was computed from, so a
+    caller can tell whether recomputing it would change anything (see inputs_match).
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.meta_path = os.path.join(store_dir, META_FILE)
+        self._lock = threading.Lock()
+        self._state = self._read_state()
+
+    def _values_path(self, generation):
+        return os.path.join(self.store_dir, f"values-{generation}.bin")
+
+    def _open_values(self, state, mode='r'):
+        if not state.users:
+            return np.empty((0, state.capacity))
+        return np.memmap(self._values_path(state.generation), dtype=np.float64, mode=mode,
+                         shape=(len(state.users), state.capacity))
+
+    def _read_state(self):
+        for _ in range(3):
+            stamp = _meta_stamp(self.meta_path)
+            if stamp is None:
+                return _StoreState(users=[], rows={}, dates=np.array([], dtype='datetime64[D]'),
+                                   capacity=INITIAL_DATE_CAPACITY, generation=0, version=0,
+                                   values=np.empty((0, INITIAL_DATE_CAPACITY)), stamp=None, changes=[])
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            users = meta['users']
+            state = _StoreState(users=users,
+                                rows={user: row for row, user in enumerate(users)},
+                                dates=np.array(meta['dates'], dtype='datetime64[D]'),
+                                capacity=meta['capacity'],
+                                generation=meta['generation'],
+                                version=meta['version'],
+                                values=None,
+                                stamp=stamp,
+                                changes=meta.get('changes', []))
+            try:
+                return state._replace(values=self._open_values(state))
+            except FileNotFoundError:
+                # A writer moved to a new generation between reading meta.json and mapping; retry
+                continue
+        raise RuntimeError(f"Portfolio store in {self.store_dir} keeps changing under the reader")
+
+    def current(self):
+        """The latest state, re-mapping first if another process has written since the last look."""
+        state = self._state
+        if state.stamp != _meta_stamp(self.meta_path):
+            state = self._state = self._read_state()
+        return state
+
+    # --- reads ---
+
+    @property
+    def users(self):
+        return list(self.current().users)
+
+    @property
+    def version(self):
+        """Bumped on every write, by any process."""
+        return self.current().version
+
+    def __contains__(self, user):
+        return user in self.current().rows
+
+    def __len__(self):
+        return len(self.current().users)
+
+    def series(self, user):
+        """A user's value series indexed by date, copied out of the map; KeyError if not stored."""
+        state = self.current()
+        row = state.rows[user]
+        values = np.array(state.values[row, :len(state.dates)])
+        stored = np.isfinite(values)
+        return pd.Series(values[stored], index=pd.DatetimeIndex(state.dates[stored], name='Date'),
+                         name='Portfolio')
+
+    def frame(self, users=None):
+        """dates x users DataFrame (every user by default), NaN where a user has no value."""
+        state = self.current()
+        users = state.users if users is None else list(users)
+        rows = [state.rows[user] for user in users]
+        values = np.array(state.values[rows, :len(state.dates)]).T
+        return pd.DataFrame(values, index=pd.DatetimeIndex(state.dates, name='Date'), columns=users)
+
+    def changed_since(self, version):
+        """(current version, users written after `version`), or None for the users if the log
+        doesn't reach back that far or one of those writes touched too many users to list."""
+        state = self.current()
+        if version == state.version:
+            return state.version, set()
+        entries = [entry for entry in state.changes if entry[0] > version]
+        if len(entries) != state.version - version or any(users is None for _, users in entries):
+            return state.version, None
+        return state.version, {user for _, users in entries for user in users}
+
+    def inputs_match(self, user, inputs):
+        """True if the user's stored series was computed from these inputs (see replace)."""
+        state = self.current()
+        row = state.rows.get(user)
+        if row is None or inputs is None:
+            return False
+        try:
+            with open(os.path.join(self.store_dir, INPUTS_FILE), 'rb') as f:
+                f.seek(row * INPUTS_DIGEST_BYTES)
+                stored = f.read(INPUTS_DIGEST_BYTES)
+        except FileNotFoundError:
+            return False
+        return stored == inputs_digest(inputs)
+
+    def fingerprint(self, user):
+        """Hash of a user's stored series, or None if they have none; unchanged by identical rewrites."""
+        state = self.current()
+        row = state.rows.get(user)
+        if row is None:
+            return (user, None)
+        values = np.array(state.values[row, :len(state.dates)])
+        stored = np.isfinite(values)
+        digest = hashlib.sha256(state.dates[stored].tobytes())
+        digest.update(values[stored].tobytes())
+        return (user, digest.hexdigest())
+
+    # --- writes ---
+
+    @contextmanager
+    def _writing(self):
+        # One writer at a time, within this process and (where flock exists) across processes
+        with self._lock:
+            os.makedirs(self.store_dir, exist_ok=True)
+            with open(os.path.join(self.store_dir, LOCK_FILE), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield self.current()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _commit(self, state, changed_users):
+        # meta.json goes last, so other processes only ever map a fully written values file
+        changed_users = list(dict.fromkeys(changed_users))
+        entry = [state.version + 1, changed_users if len(changed_users) <= CHANGE_LOG_MAX_USERS else None]
+        meta = {'users': state.users,
+                'dates': [str(date) for date in state.dates],
+                'capacity': state.capacity,
+                'generation': state.generation,
+                'version': state.version + 1,
+                'changes': (state.changes + [entry])[-CHANGE_LOG_VERSIONS:]}
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+        old_generation = self._state.generation
+        self._state = self._read_state()
+        if old_generation != state.generation:
+            try:
+                os.remove(self._values_path(old_generation))
+            except FileNotFoundError:
+                pass
+
+    def _rewrite(self, state, dates):
+        # Re-lay every row onto a new date axis in a new generation file; the only full rewrite
+        capacity = state.capacity
+        while capacity < len(dates):
+            capacity *= 2
+        values = np.full((len(state.users), capacity), np.nan)
+        if state.users:
+            values[:, np.searchsorted(dates, state.dates)] = state.values[:, :len(state.dates)]
+        generation = state.generation + 1
+        values.tofile(self._values_path(generation))
+        return state._replace(dates=dates, capacity=capacity, generation=generation, values=None)
+
+    def _add_dates(self, state, dates):
+        dates = np.setdiff1d(dates, state.dates)
+        if not len(dates):
+            return state
+        if len(state.dates) and dates[0] <= state.dates[-1]:
+            # Back-filling before the last stored date moves existing columns
+            return self._rewrite(state, np.union1d(state.dates, dates))
+        new_axis = np.concatenate([state.dates, dates])
+        if len(new_axis) > state.capacity:
+            return self._rewrite(state, new_axis)
+        # Spare capacity is already NaN in every row, so the new columns need no writes
+        return state._replace(dates=new_axis)
+
+    def _write_inputs(self, state, digests_by_user):
+        # Rows written before a user had a digest read back as all zeros, which never matches
+        inputs_path = os.path.join(self.store_dir, INPUTS_FILE)
+        with open(inputs_path, 'ab') as f:
+            f.truncate(max(f.tell(), len(state.users) * INPUTS_DIGEST_BYTES))
+        with open(inputs_path, 'r+b') as f:
+            for user, digest in digests_by_user.items():
+                f.seek(state.rows[user] * INPUTS_DIGEST_BYTES)
+                f.write(digest)
+
+    def _add_users(self, state, users):
+        new_users = [user for user in dict.fromkeys(users) if user not in state.rows]
+        if not new_users:
+            return state
+        # Append empty rows to the end of the file; existing rows don't move
+        with open(self._values_path(state.generation), 'ab') as f:
+            f.write(np.full((len(new_users), state.capacity), np.nan).tobytes())
+        users = state.users + new_users
+        return state._replace(users=users, rows={user: row for row, user in enumerate(users)})
+
+    def replace(self, user, series, inputs=None):
+        """Store a user's whole value series (date-indexed), leaving every other user's row alone.
+
+        inputs is anything repr-able the series was computed from; inputs_match(user, inputs)
+        is True afterwards. Without it, any earlier digest for the user is cleared.
+        """
+        series = series.dropna()
+        dates = series.index.values.astype('datetime64[D]')
+        with self._writing() as state:
+            state = self._add_dates(state, np.unique(dates))
+            state = self._add_users(state, [user])
+
+            row = np.full(state.capacity, np.nan)
+            row[np.searchsorted(state.dates, dates)] = series.to_numpy(dtype=np.float64)
+            values = self._open_values(state, 'r+')
+            values[state.rows[user]] = row
+            values.flush()
+            del values
+
+            self._write_inputs(state, {user: inputs_digest(inputs)})
+            self._commit(state, [user])
+
+    def replace_many(self, portfolios, inputs_by_user=None):
+        """replace() for every column of a dates x users DataFrame, in a single write."""
+        inputs_by_user = inputs_by_user or {}
+        dates = portfolios.index.values.astype('datetime64[D]')
+        with self._writing() as state:
+            state = self._add_dates(state, np.unique(dates))
+            state = self._add_users(state, [str(user) for user in portfolios.columns])
+
+            rows = np.full((len(portfolios.columns), state.capacity), np.nan)
+            rows[:, np.searchsorted(state.dates, dates)] = portfolios.to_numpy(dtype=np.float64).T
+            values = self._open_values(state, 'r+')
+            values[[state.rows[str(user)] for user in portfolios.columns]] = rows
+            values.flush()
+            del values
+
+            self._write_inputs(state, {str(user): inputs_digest(inputs_by_user.get(user))
+                                       for user in portfolios.columns})
+            self._commit(state, [str(user) for user in portfolios.columns])
+
+    def append_day(self, date, values_by_user):
+        """Write one date's value for each user in values_by_user; the date must not precede the last one."""
+        date = np.datetime64(pd.Timestamp(date).date(), 'D')
+        with self._writing() as state:
+            if len(state.dates) and date < state.dates[-1]:
+                raise ValueError(f"append_day needs a date on or after {state.dates[-1]}, got {date}")
+            state = self._add_dates(state, np.array([date]))
+            state = self._add_users(state, list(values_by_user))
+
+            column = len(state.dates) - 1
+            values = self._open_values(state, 'r+')
+            for user, value in values_by_user.items():
+                values[state.rows[user], column] = value
+            values.flush()
+            del values
+
+            # The series no longer match what they were computed from
+            self._write_inputs(state, {user: inputs_digest(None) for user in values_by_user})
+            self._commit(state, list(values_by_user))
+
+
+def inputs_digest(inputs):
+    """Fixed-size digest of a valuation's inputs; None gets the all-zero digest, which never matches."""
+    if inputs is None:
+        return bytes(INPUTS_DIGEST_BYTES)
+    return hashlib.sha256(repr(inputs).encode('utf-8')).digest()[:INPUTS_DIGEST_BYTES]
+
+
+def import_csv_portfolios(store, directory=PORTFOLIO_DIR):
+    """Load every <user>_portfolio.csv in directory into the store, in a single write."""
+    if not os.path.isdir(directory):
+        return 0
+    portfolios = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('_portfolio.csv'):
+            user = filename[:-len('_portfolio.csv')]
+            df = pd.read_csv(os.path.join(directory, filename), usecols=["Date", "Portfolio"],
+                             index_col='Date', parse_dates=True)
+            portfolios[user] = df['Portfolio']
+    if portfolios:
+        # Aligned on the union of their dates; a user's missing days stay NaN, which stores nothing
+        store.replace_many(pd.DataFrame(portfolios))
+    print(f"Imported {len(portfolios)} portfolio CSVs from {directory}/ into the portfolio store.")
+    return len(portfolios)
+
+
+def get_portfolio_store(store_dir=STORE_DIR):
+    """The process-wide store for store_dir, created (and seeded from PORTFOLIO_DIR) on first use."""
+    key = os.path.abspath(store_dir)
+    store = _stores.get(key)
+    if store is None:
+        store = PortfolioStore(store_dir)
+        if store.current().stamp is None:
+            import_csv_portfolios(store)
+        store = _stores.setdefault(key, store)
+    return store
+
+
+if __name__ == '__main__':
+    import_csv_portfolios(PortfolioStore())
@@ -0,0 +1,235 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from portfolio_analysis.tracing import span, traced
+
+DATA_DIR = 'data'
+PANEL_DIR = 'panel'
+SYMBOLS_FILE = 'sp500_symbols.csv'
+# Names the generation directory readers should map; swapped atomically by each build
+CURRENT_FILE = 'CURRENT'
+# Files of a panel built before generations, removed once the first generation is current
+LEGACY_FILES = ('prices.npy', 'dates.npy', 'symbols.json')
+
+# Loaded panels, keyed by panel directory, so each process maps the files only once
+_panels = {}
+
+
+class PricePanel:
+    """Dates x symbols Adj Close panel backed by memory-mapped .npy files."""
+
+    def __init__(self, dates, symbols, values, fingerprint=None, symbol_list=None, spy_normalized=None,
+                 stamp=None):
+        self.dates = dates
+        self.symbols = symbols
+        # Stored symbol-major (symbols x dates), so one symbol's history is one contiguous block
+        self.values = values
+        self.index = pd.DatetimeIndex(dates, name='Date')
+        self._columns = {symbol: i for i, symbol in enumerate(symbols)}
+        # Changes whenever the panel is rebuilt; used to tell whether derived output is stale
+        self.fingerprint = fingerprint
+        # The S&P 500 registry and SPY / SPY[0] as of this build, when the build had them
+        self.symbol_list = symbol_list
+        self.spy_normalized = spy_normalized
+        # CURRENT as it was when this generation was mapped; a different one means re-attach
+        self.stamp = stamp
+
+    def __contains__(self, symbol):
+        return symbol in self._columns
+
+    def column(self, symbol):
+        """Return the price history of one symbol as a zero-copy view into the panel."""
+        return self.values[self._columns[symbol]]
+
+    def series(self, symbol):
+        """Return one symbol's prices as a date-indexed Series without copying the data."""
+        return pd.Series(self.column(symbol), index=self.index, name=symbol, copy=False)
+
+    def frame(self, symbols, dates=None):
+        """Return a dates x symbols DataFrame for the requested symbols, gathered in one copy."""
+        rows = [self._columns[symbol] for symbol in symbols]
+        if dates is None:
+            return pd.DataFrame(self.values[rows].T, index=self.index, columns=list(symbols))
+
+        # Keep only the panel dates that were asked for; other dates had no trading anyway
+        positions = np.flatnonzero(self.index.isin(dates))
+        values = self.values[np.ix_(rows, positions)]
+        return pd.DataFrame(values.T, index=self.index[positions], columns=list(symbols))
+
+
+def _generation_dirs(panel_dir):
+    """{generation number: directory} for every gen-<n> directory under panel_dir."""
+    generations = {}
+    if os.path.isdir(panel_dir):
+        for name in os.listdir(panel_dir):
+            if name.startswith('gen-') and name[len('gen-'):].isdigit():
+                generations[int(name[len('gen-'):])] = os.path.join(panel_dir, name)
+    return generations
+
+
+def _current_stamp(panel_dir):
+    # os.replace gives CURRENT a new inode on every swap, so this changes even within one mtime tick
+    try:
+        stat = os.stat(os.path.join(panel_dir, CURRENT_FILE))
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def _read_current(panel_dir):
+    """Directory of the generation CURRENT points at, or panel_dir itself for a pre-generation panel."""
+    try:
+        with open(os.path.join(panel_dir, CURRENT_FILE)) as f:
+            return os.path.join(panel_dir, f.read().strip())
+    except FileNotFoundError:
+        return panel_dir
+
+
+def _new_generation_dir(panel_dir):
+    # Claim the next number with mkdir, so two builds running at once never share a directory
+    os.makedirs(panel_dir, exist_ok=True)
+    while True:
+        generation = max(_generation_dirs(panel_dir), default=0) + 1
+        generation_dir = os.path.join(panel_dir, f"gen-{generation:06d}")
+        try:
+            os.mkdir(generation_dir)
+            return generation, generation_dir
+        except FileExistsError:
+            continue
+
+
+def _remove_old_generations(panel_dir, keep):
+    # Processes still mapping a removed generation keep reading it until they re-attach; the
+    # files only disappear once the last map is gone
+    for generation_dir in _generation_dirs(panel_dir).values():
+        if os.path.basename(generation_dir) not in keep:
+            shutil.rmtree(generation_dir, ignore_errors=True)
+    for name in LEGACY_FILES:
+        try:
+            os.remove(os.path.join(panel_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def build_price_panel(data_dir=DATA_DIR, panel_dir=PANEL_DIR, symbols_file=SYMBOLS_FILE):
+    """Pack every <SYMBOL>.csv in data_dir into a new panel generation and make it current.
+
+    Each build writes a complete gen-<n>/ directory (prices, dates, symbols, the symbol registry
+    and normalized SPY), then swaps the one-line CURRENT file to name it. Readers re-attach to
+    the new generation the next time they ask for the panel.
+    """
+    prices_by_symbol = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith('.csv'):
+            continue
+        symbol = filename[:-len('.csv')]
+        df = pd.read_csv(os.path.join(data_dir, filename),
+                         index_col='Date',
+                         parse_dates=True,
+                         usecols=['Date', 'Adj Close'],
+                         na_values='NaN')
+        prices_by_symbol[symbol] = df['Adj Close']
+
+    # Align all symbols on the union of trading dates; gaps stay NaN
+    prices = pd.concat(prices_by_symbol, axis=1).sort_index()
+    symbols = [str(symbol) for symbol in prices.columns]
+    dates = prices.index.values.astype('datetime64[D]')
+    values = np.ascontiguousarray(prices.to_numpy(dtype=np.float64).T)
+
+    generation, generation_dir = _new_generation_dir(panel_dir)
+    np.save(os.path.join(generation_dir, 'prices.npy'), values)
+    np.save(os.path.join(generation_dir, 'dates.npy'), dates)
+    with open(os.path.join(generation_dir, 'symbols.json'), 'w') as f:
+        json.dump(symbols, f)
+
+    # The reference series every worker needs, so they map them instead of each rebuilding them
+    if os.path.exists(symbols_file):
+        symbol_list = pd.read_csv(symbols_file)['Symbol'].tolist()
+        with open(os.path.join(generation_dir, 'symbol_list.json'), 'w') as f:
+            json.dump(symbol_list, f)
+    if 'SPY' in prices.columns:
+        spy = values[symbols.index('SPY')]
+        np.save(os.path.join(generation_dir, 'spy_normalized.npy'), spy / spy[0])
+
+    # Swap CURRENT last: until then every reader stays on the previous generation
+    previous_dir = _read_current(panel_dir)
+    tmp_path = os.path.join(panel_dir, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(os.path.basename(generation_dir))
+    os.replace(tmp_path, os.path.join(panel_dir, CURRENT_FILE))
+
+    # Keep the previous generation for readers that read CURRENT just before the swap
+    _remove_old_generations(panel_dir, keep={os.path.basename(generation_dir), os.path.basename(previous_dir)})
+
+    _panels.pop(os.path.abspath(panel_dir), None)
+    print(f"Packed {len(symbols)} symbols x {len(dates)} dates into {generation_dir}/")
+    return get_price_panel(panel_dir)
+
+
+@traced('panel.load')
+def load_price_panel(panel_dir=PANEL_DIR):
+    """Memory-map the current generation of a panel written by build_price_panel."""
+    for _ in range(3):
+        stamp = _current_stamp(panel_dir)
+        generation_dir = _read_current(panel_dir)
+        try:
+            with open(os.path.join(generation_dir, 'symbols.json')) as f:
+                symbols = json.load(f)
+            dates = np.load(os.path.join(generation_dir, 'dates.npy'))
+            prices_path = os.path.join(generation_dir, 'prices.npy')
+            values = np.load(prices_path, mmap_mode='r')
+            stat = os.stat(prices_path)
+
+            symbol_list = None
+            symbol_list_path = os.path.join(generation_dir, 'symbol_list.json')
+            if os.path.exists(symbol_list_path):
+                with open(symbol_list_path) as f:
+                    symbol_list = json.load(f)
+            spy_normalized = None
+            spy_path = os.path.join(generation_dir, 'spy_normalized.npy')
+            if os.path.exists(spy_path):
+                spy_normalized = np.load(spy_path, mmap_mode='r')
+        except FileNotFoundError:
+            # Two builds in a row removed the generation between reading CURRENT and mapping it; retry
+            continue
+
+        panel = PricePanel(dates, symbols, values, fingerprint=(prices_path, stat.st_mtime_ns, stat.st_size),
+                           symbol_list=symbol_list, spy_normalized=spy_normalized, stamp=stamp)
+        _panels[os.path.abspath(panel_dir)] = panel
+        return panel
+    raise RuntimeError(f"Price panel in {panel_dir} keeps changing under the reader")
+
+
+def get_price_panel(panel_dir=PANEL_DIR):
+    """The current generation's panel, re-attaching after a rebuild; None if it has not been built yet."""
+    panel = _panels.get(os.path.abspath(panel_dir))
+    if panel is not None and panel.stamp == _current_stamp(panel_dir):
+        return panel
+    if not os.path.exists(os.path.join(_read_current(panel_dir), 'symbols.json')):
+        return None
+    return load_price_panel(panel_dir)
+
+
+def read_adj_close(symbol, path=DATA_DIR):
+    """Return a one-column (symbol) Adj Close DataFrame indexed by date."""
+    # Serve from the memory-mapped panel when it covers this symbol, otherwise parse the CSV
+    panel = get_price_panel() if path == DATA_DIR else None
+    if panel is not None and symbol in panel:
+        return panel.series(symbol).to_frame()
+
+    file_path = os.path.join(path, f"{symbol}.csv")
+    with span('prices.read_csv', symbol=symbol):
+        df_temp = pd.read_csv(file_path,
+                              index_col='Date',
+                              parse_dates=True,
+                              usecols=['Date', 'Adj Close'],
+                              na_values='NaN')
+    return df_temp.rename(columns={'Adj Close': symbol})
+
+
+if __name__ == '__main__':
+    build_price_panel()
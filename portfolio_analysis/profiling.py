@@ -0,0 +1,113 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from portfolio_analysis.tracing import current_trace
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+# Share of requests profiled without being asked, e.g. PROFILE_SAMPLE_RATE=0.01 for 1 in 100
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+# Only these endpoints are sampled (comma separated, e.g. "league,dashboard"); empty means all
+PROFILE_ENDPOINTS = [endpoint for endpoint in os.environ.get('PROFILE_ENDPOINTS', '').split(',') if endpoint]
+# Functions listed in each hotspot summary
+PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', 40))
+# Without a token, nobody can ask for a profile; sampling still works
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN') or os.environ.get('ADMIN_TOKEN')
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_QUERY_ARG = 'profile'
+
+# cProfile can only have one profiler running per process on newer Pythons, so requests take turns
+_profiler_lock = threading.Lock()
+
+
+def requested(headers, args, token=PROFILE_TOKEN):
+    """True if the request carries the admin profiling token in the header or query string."""
+    if not token:
+        return False
+    offered = headers.get(PROFILE_HEADER) or args.get(PROFILE_QUERY_ARG)
+    return offered is not None and hmac.compare_digest(offered.encode('utf-8'), token.encode('utf-8'))
+
+
+def sampled(endpoint, rate=PROFILE_SAMPLE_RATE, endpoints=PROFILE_ENDPOINTS):
+    if rate <= 0 or (endpoints and endpoint not in endpoints):
+        return False
+    return random.random() < rate
+
+
+def hotspot_summary(profiler, top_n=PROFILE_TOP_N):
+    """pstats text of the top_n functions by cumulative time, then by time spent in the function itself."""
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).strip_dirs()
+    out.write("=== By cumulative time ===\n")
+    stats.sort_stats('cumulative').print_stats(top_n)
+    out.write("=== By own time ===\n")
+    stats.sort_stats('tottime').print_stats(top_n)
+    return out.getvalue()
+
+
+def save_profile(profiler, name, header_lines, directory=PROFILE_DIR, top_n=PROFILE_TOP_N):
+    """Write <name>.prof (for snakeviz / pstats) and <name>.txt (hotspots); returns the .prof path."""
+    os.makedirs(directory, exist_ok=True)
+    prof_path = os.path.join(directory, f"{name}.prof")
+    profiler.dump_stats(prof_path)
+    with open(os.path.join(directory, f"{name}.txt"), 'w') as f:
+        f.write('\n'.join(header_lines) + '\n\n')
+        f.write(hotspot_summary(profiler, top_n))
+    return prof_path
+
+
+def init_app(app):
+    """Profile requests that ask for it (admin token) or are sampled, writing each to PROFILE_DIR."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        if not (requested(request.headers, request.args) or sampled(request.endpoint)):
+            return
+        if not _profiler_lock.acquire(blocking=False):
+            print(f"Skipping profile of {request.path}: another request is being profiled.")
+            return
+        g.profiler = cProfile.Profile()
+        g.profile_start = time.perf_counter()
+        g.profiler.enable()
+
+    @app.after_request
+    def _finish_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        _profiler_lock.release()
+
+        seconds = time.perf_counter() - g.pop('profile_start')
+        trace = current_trace()
+        request_id = trace.request_id if trace is not None else f"{os.getpid()}"
+        # Request ids can come from the client's X-Request-ID; keep them from steering the path
+        request_id = re.sub(r'[^A-Za-z0-9_-]', '_', request_id)[:64]
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{request.endpoint or 'unmatched'}_{request_id}"
+        # Keep the admin token out of the summary file
+        query = '&'.join(f"{key}={value}" for key, value in request.args.items(multi=True)
+                         if key != PROFILE_QUERY_ARG)
+        prof_path = save_profile(profiler, name, [
+            f"{request.method} {request.path}{'?' + query if query else ''}",
+            f"endpoint: {request.endpoint}  status: {response.status_code}  duration: {seconds * 1000:.1f} ms",
+            f"request_id: {request_id}",
+        ])
+        response.headers['X-Profile'] = os.path.basename(prof_path)
+        print(f"Profiled {request.path} in {seconds * 1000:.1f} ms: {prof_path}")
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # Only still set if after_request never ran for this request
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
@@ -0,0 +1,117 @@
+import os
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from portfolio_analysis.metrics import cross_sectional_metrics, metrics_documents
+from portfolio_analysis.price_panel import SYMBOLS_FILE, get_price_panel, read_adj_close
+from portfolio_analysis.tracing import traced
+
+# Touched by import_stock_data.py and calc_stats.py when they finish, telling every app
+# process to reload its reference data on its next request
+REFERENCE_STAMP = 'reference.stamp'
+
+# One immutable load of the per-deployment constants, swapped in whole on refresh. Stock metrics
+# are not part of it: render workers only need SPY, so metrics load separately on first use
+ReferenceSnapshot = namedtuple('ReferenceSnapshot', ['symbol_list', 'symbols', 'spy_normalized',
+                                                     'stamp', 'panel_stamp', 'loaded_at'])
+
+
+def _stamp_mtime(stamp_file):
+    try:
+        return os.stat(stamp_file).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def touch_reference_stamp(stamp_file=REFERENCE_STAMP):
+    """Signal running app processes that the data behind their reference cache changed."""
+    with open(stamp_file, 'a'):
+        pass
+    os.utime(stamp_file)
+
+
+class ReferenceData:
+    """Symbol registry, normalized SPY and stock metrics, loaded once instead of per request."""
+
+    def __init__(self, symbols_file=SYMBOLS_FILE, stamp_file=REFERENCE_STAMP):
+        self.symbols_file = symbols_file
+        self.stamp_file = stamp_file
+        self.metrics_collection = None
+        self._snapshot = None
+        # (snapshot, {symbol: metrics document}) for the snapshot the metrics were loaded with
+        self._metrics = None
+
+    def configure(self, metrics_collection):
+        """Where stock metrics are loaded from; without one they are computed from the price panel."""
+        self.metrics_collection = metrics_collection
+        self._snapshot = None
+        self._metrics = None
+
+    @traced('reference.refresh')
+    def refresh(self):
+        stamp = _stamp_mtime(self.stamp_file)
+        panel = get_price_panel()
+
+        # The panel generation carries the registry and normalized SPY, mapped rather than rebuilt
+        if panel is not None and panel.symbol_list is not None:
+            symbol_list = panel.symbol_list
+        else:
+            symbol_list = pd.read_csv(self.symbols_file)['Symbol'].tolist()
+
+        if panel is not None and panel.spy_normalized is not None:
+            spy_normalized = pd.Series(panel.spy_normalized, index=panel.index, name='SPY', copy=False)
+        else:
+            spy = read_adj_close('SPY')['SPY']
+            spy_normalized = spy / spy.iloc[0]
+
+        self._snapshot = ReferenceSnapshot(symbol_list=symbol_list,
+                                           symbols=frozenset(symbol_list),
+                                           spy_normalized=spy_normalized,
+                                           stamp=stamp,
+                                           panel_stamp=panel.stamp if panel is not None else None,
+                                           loaded_at=time.time())
+        print(f"Loaded reference data: {len(symbol_list)} symbols.")
+        return self._snapshot
+
+    def current(self):
+        """Return the loaded snapshot, reloading first if a data job has touched the stamp or a new
+        price panel generation has been swapped in."""
+        snapshot = self._snapshot
+        panel = get_price_panel()
+        panel_stamp = panel.stamp if panel is not None else None
+        if snapshot is None or snapshot.stamp != _stamp_mtime(self.stamp_file) or snapshot.panel_stamp != panel_stamp:
+            snapshot = self.refresh()
+        return snapshot
+
+    def stock_metrics(self):
+        """{symbol: metrics document} for the current snapshot, loaded the first time it is asked for."""
+        snapshot = self.current()
+        metrics = self._metrics
+        if metrics is None or metrics[0] is not snapshot:
+            metrics = self._metrics = (snapshot, self._load_stock_metrics(snapshot))
+        return metrics[1]
+
+    @traced('reference.stock_metrics')
+    def _load_stock_metrics(self, snapshot):
+        stock_metrics = {}
+        if self.metrics_collection is not None:
+            try:
+                for document in self.metrics_collection.find({}, {'_id': 0}):
+                    stock_metrics[document['stock_name']] = document
+            except Exception as e:
+                print(f"Could not load stock metrics into the reference cache: {e}")
+
+        # Without stored metrics, compute the same table straight from the price panel
+        panel = get_price_panel()
+        if not stock_metrics and panel is not None:
+            covered = [symbol for symbol in snapshot.symbol_list if symbol in panel]
+            for document in metrics_documents(cross_sectional_metrics(panel.frame(covered))):
+                stock_metrics[document['stock_name']] = document
+
+        print(f"Loaded {len(stock_metrics)} stock metrics.")
+        return stock_metrics
+
+
+reference_data = ReferenceData()
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import re
+from collections import namedtuple
+
+from portfolio_analysis.tracing import span
+
+STATIC_DIR = 'static'
+RENDER_DIR = os.path.join(STATIC_DIR, 'render_cache')
+
+# Upper bound on the cache's disk use; least recently used images go first
+MAX_CACHE_BYTES = int(os.environ.get('RENDER_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+
+# One chart to draw: render(*args, image_path) draws it, key_parts is everything the image depends on.
+# render must be a module-level function so the job can be shipped to a render process.
+RenderJob = namedtuple('RenderJob', ['kind', 'key_parts', 'render', 'args'])
+
+
+def file_fingerprint(file_path):
+    """Cheap change marker for an input file: (path, mtime, size), with None for a missing file."""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return (file_path, None)
+    return (file_path, stat.st_mtime_ns, stat.st_size)
+
+
+def content_fingerprint(file_path):
+    """Hash of a small input file's bytes, for inputs that get rewritten with the same content."""
+    try:
+        with open(file_path, 'rb') as f:
+            return (file_path, hashlib.sha256(f.read()).hexdigest())
+    except FileNotFoundError:
+        return (file_path, None)
+
+
+def render_key(kind, key_parts):
+    """Hash the plot type and everything its output depends on into a cache key."""
+    digest = hashlib.sha256(repr((kind, key_parts)).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def cached_image_path(kind, key_parts, directory=RENDER_DIR):
+    """Where the image for these inputs lives (or will live) in the cache."""
+    return os.path.join(directory, f"{kind}_{render_key(kind, key_parts)}.png")
+
+
+def is_cache_filename(filename):
+    """True if filename (relative to static/) has the shape cached_image_path gives, drawn yet or not."""
+    return re.fullmatch(r'\w+_[0-9a-f]{32}\.png', filename.rpartition('/')[2]) is not None and \
+        os.path.dirname(filename) == static_filename(RENDER_DIR)
+
+
+def static_filename(image_path):
+    """Path relative to static/, as url_for('static', filename=...) expects."""
+    return os.path.relpath(image_path, STATIC_DIR).replace(os.sep, '/')
+
+
+def lookup(image_path):
+    """Return True on a cache hit, marking the image as recently used."""
+    if not os.path.exists(image_path):
+        return False
+    try:
+        os.utime(image_path)
+    except FileNotFoundError:
+        # Evicted between the check and the touch
+        return False
+    return True
+
+
+def store(image_path, render, max_bytes=MAX_CACHE_BYTES):
+    """Render into the cache through a temp file, then evict down to max_bytes."""
+    directory = os.path.dirname(image_path)
+    os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{image_path}.{os.getpid()}.tmp"
+    render(tmp_path)
+    os.replace(tmp_path, image_path)
+
+    evict(directory, max_bytes, keep=image_path)
+
+
+def job_image_path(job, directory=RENDER_DIR):
+    return cached_image_path(job.kind, job.key_parts, directory)
+
+
+def run_job(job, directory=RENDER_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Return the static filename of the job's image, rendering it only on a cache miss."""
+    image_path = job_image_path(job, directory)
+    if lookup(image_path):
+        return static_filename(image_path)
+
+    with span(f"render.{job.kind}"):
+        store(image_path, lambda tmp_path: job.render(*job.args, tmp_path), max_bytes)
+    print(f"Rendered {job.kind} image into the cache: {image_path}")
+    return static_filename(image_path)
+
+
+def evict(directory=RENDER_DIR, max_bytes=MAX_CACHE_BYTES, keep=None):
+    """Delete least recently used images until the cache fits in max_bytes."""
+    entries = []
+    total_bytes = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith('.png'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total_bytes += stat.st_size
+
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
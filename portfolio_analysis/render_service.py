@@ -0,0 +1,106 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from portfolio_analysis.render_cache import (STATIC_DIR, is_cache_filename, job_image_path, lookup, run_job,
+                                             static_filename)
+from portfolio_analysis.tracing import observe
+
+# RENDER_WORKERS=0 renders inline in the request instead of in a process pool
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 2))
+# Most render jobs allowed to be queued or running at once
+RENDER_QUEUE_SIZE = int(os.environ.get('RENDER_QUEUE_SIZE', 64))
+# Fresh interpreters instead of forking a threaded web worker
+RENDER_START_METHOD = os.environ.get('RENDER_START_METHOD', 'spawn')
+
+READY = 'ready'
+PENDING = 'pending'
+FAILED = 'failed'
+MISSING = 'missing'
+
+
+class RenderService:
+    """Renders charts in a process pool, off the request thread, deduping identical jobs."""
+
+    def __init__(self, max_workers=RENDER_WORKERS, max_pending=RENDER_QUEUE_SIZE):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        # static filename -> Future for every job that is queued or running
+        self._pending = {}
+        self._failed = set()
+
+    def _get_executor(self):
+        # Created on first use so every web worker process gets its own pool
+        if self._executor is None:
+            context = multiprocessing.get_context(RENDER_START_METHOD)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            atexit.register(self.shutdown)
+        return self._executor
+
+    def submit(self, job):
+        """Queue a job unless its image is cached or already on the way; returns (filename, ready)."""
+        if self.max_workers <= 0:
+            return run_job(job), True
+
+        image_path = job_image_path(job)
+        filename = static_filename(image_path)
+        if lookup(image_path):
+            return filename, True
+
+        with self._lock:
+            if filename in self._pending:
+                return filename, False
+
+            if len(self._pending) >= self.max_pending:
+                # Queue is full: draw it here rather than hand back a chart that may never arrive
+                print(f"Render queue full ({self.max_pending} jobs), rendering {job.kind} inline.")
+                return run_job(job), True
+
+            self._failed.discard(filename)
+            future = self._get_executor().submit(run_job, job)
+            self._pending[filename] = future
+
+        submitted = time.perf_counter()
+        future.add_done_callback(lambda f: self._finished(filename, f, job.kind, submitted))
+        return filename, False
+
+    def _finished(self, filename, future, kind, submitted):
+        # The render's own span is recorded in the worker process; count queue wait plus render here
+        observe(f"render_pool.{kind}", time.perf_counter() - submitted)
+        with self._lock:
+            self._pending.pop(filename, None)
+            if future.cancelled():
+                self._failed.add(filename)
+            elif future.exception() is not None:
+                self._failed.add(filename)
+                print(f"Rendering {filename} failed: {future.exception()}")
+
+    def status(self, filename):
+        """READY, PENDING or FAILED for a filename returned by submit, MISSING if it can't be one.
+
+        Each web worker has its own pool, so a poll can reach a worker that never saw the job:
+        a cache filename with no image yet is PENDING unless this worker saw its render fail.
+        """
+        with self._lock:
+            if filename in self._pending:
+                return PENDING
+            if filename in self._failed:
+                return FAILED
+        if os.path.exists(os.path.join(STATIC_DIR, filename)):
+            return READY
+        if is_cache_filename(filename):
+            return PENDING
+        return MISSING
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+render_service = RenderService()
@@ -0,0 +1,131 @@
+import os
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+from portfolio_analysis.tracing import span, traced
+
+DB_NAME = 'sample_mflix'
+USERS_COLLECTION = 'test_users'
+METRICS_COLLECTION = 'stock_metrics'
+
+# Connection pool settings, overridable per deployment
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 10000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+
+# Fields each call site actually needs, so the password hash only leaves the database for login
+CREDENTIALS_PROJECTION = {'_id': 0, 'user': 1, 'password': 1}
+PORTFOLIO_PROJECTION = {'_id': 0, 'user': 1, 'collection_of_stocks': 1, 'allocations': 1, 'portfolio_value': 1}
+METRICS_PROJECTION = {'_id': 0}
+
+
+def client_options():
+    """Pool and timeout settings passed to every MongoClient."""
+    return {
+        'maxPoolSize': MONGO_MAX_POOL_SIZE,
+        'minPoolSize': MONGO_MIN_POOL_SIZE,
+        'maxIdleTimeMS': MONGO_MAX_IDLE_TIME_MS,
+        'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+        'socketTimeoutMS': MONGO_SOCKET_TIMEOUT_MS,
+        'waitQueueTimeoutMS': MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    }
+
+
+def create_client(uri=None, **overrides):
+    """A pooled MongoClient for MONGO_URI (or uri); keyword arguments override client_options."""
+    if uri is None:
+        uri = os.environ.get('MONGO_URI')
+    options = client_options()
+    options.update(overrides)
+    return MongoClient(uri, server_api=ServerApi('1'), **options)
+
+
+class MongoRepository:
+    """Every user and stock metrics query the app makes, each with its own projection."""
+
+    def __init__(self, db):
+        self.db = db
+        self.users = db[USERS_COLLECTION]
+        self.stock_metrics = db[METRICS_COLLECTION]
+
+    def ensure_indexes(self):
+        """Unique indexes on the lookup keys; safe to call on every startup."""
+        for collection, field in [(self.users, 'user'), (self.stock_metrics, 'stock_name')]:
+            try:
+                with span('mongo.create_index', collection=collection.name):
+                    collection.create_index([(field, ASCENDING)], unique=True, name=f"{field}_unique")
+            except PyMongoError as e:
+                # Usually duplicates already in the collection; lookups still work, just unindexed
+                print(f"Could not create a unique index on {collection.name}.{field}: {e}")
+
+    # --- users ---
+
+    @traced('mongo.get_credentials')
+    def get_credentials(self, username):
+        """Username and password hash only, for login."""
+        return self.users.find_one({'user': username}, CREDENTIALS_PROJECTION)
+
+    @traced('mongo.get_portfolio')
+    def get_portfolio(self, username):
+        """A user's holdings and starting value, without the password hash."""
+        return self.users.find_one({'user': username}, PORTFOLIO_PROJECTION)
+
+    @traced('mongo.get_portfolios')
+    def get_portfolios(self, usernames=None):
+        """Holdings for many users (every user by default) in one query, keyed by username."""
+        query = {} if usernames is None else {'user': {'$in': list(usernames)}}
+        return {document['user']: document for document in self.users.find(query, PORTFOLIO_PROJECTION)}
+
+    @traced('mongo.create_user')
+    def create_user(self, username, hashed_password, portfolio_value=10000):
+        """Insert a new user; returns False if the username is taken."""
+        user_data = {
+            'user': username,
+            'password': hashed_password,
+            'collection_of_stocks': [],
+            'allocations': [],
+            'portfolio_value': portfolio_value
+        }
+        try:
+            self.users.insert_one(user_data)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    @traced('mongo.update_portfolio')
+    def update_portfolio(self, username, collection_of_stocks, allocations, portfolio_value):
+        return self.users.update_one(
+            {'user': username},
+            {'$set': {
+                'collection_of_stocks': collection_of_stocks,
+                'allocations': [float(a) for a in allocations],
+                'portfolio_value': portfolio_value
+            }}
+        )
+
+    # --- stock metrics ---
+
+    @traced('mongo.get_stock_metrics')
+    def get_stock_metrics(self, symbol):
+        return self.stock_metrics.find_one({'stock_name': symbol}, METRICS_PROJECTION)
+
+    @traced('mongo.all_stock_metrics')
+    def all_stock_metrics(self):
+        return list(self.stock_metrics.find({}, METRICS_PROJECTION))
+
+    @traced('mongo.upsert_stock_metrics')
+    def upsert_stock_metrics(self, documents):
+        """Write every document in one bulk_write, replacing any earlier metrics for the same stock."""
+        if not documents:
+            return None
+        operations = [UpdateOne({'stock_name': document['stock_name']}, {'$set': document}, upsert=True)
+                      for document in documents]
+        return self.stock_metrics.bulk_write(operations, ordered=False)
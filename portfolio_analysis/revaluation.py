@@ -0,0 +1,60 @@
+import os
+import threading
+
+from portfolio_analysis.tracing import span
+
+# How long a page that needs a user's fresh series waits for their queued revaluation
+REVALUATION_WAIT_SECONDS = float(os.environ.get('REVALUATION_WAIT_SECONDS', 5))
+
+
+class RevaluationQueue:
+    """Revalues portfolios on one background thread, so an edit's cost lands on the write side.
+
+    revalue(username, user_data) does the work. A user with an edit still queued just has it
+    replaced by the newer one, so only their latest holdings are ever valued.
+    """
+
+    def __init__(self, revalue):
+        self.revalue = revalue
+        self._condition = threading.Condition()
+        # username -> user_data, oldest first
+        self._queued = {}
+        self._running = None
+        self._thread = None
+
+    def submit(self, username, user_data):
+        with self._condition:
+            self._queued.pop(username, None)
+            self._queued[username] = user_data
+            # Started on first use, so it is always created in the process that serves requests
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='revaluation', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def pending(self, username):
+        with self._condition:
+            return username in self._queued or self._running == username
+
+    def wait(self, username, timeout=REVALUATION_WAIT_SECONDS):
+        """Block until nothing is queued or running for the user; False if timeout ran out first."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: username not in self._queued and self._running != username, timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queued)
+                username = next(iter(self._queued))
+                user_data = self._queued.pop(username)
+                self._running = username
+            try:
+                with span('revaluation.job'):
+                    self.revalue(username, user_data)
+            except Exception as e:
+                print(f"Revaluing {username}'s portfolio failed: {e}")
+            finally:
+                with self._condition:
+                    self._running = None
+                    self._condition.notify_all()
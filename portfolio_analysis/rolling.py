@@ -0,0 +1,209 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from portfolio_analysis.leaderboard import WEEKLY_DAYS
+from portfolio_analysis.portfolio_store import get_portfolio_store
+
+# Trailing windows by name, as a count of trading-day closes ('ytd' and None for all-time are
+# calendar-based); any other '<n>d' with n >= 2 is accepted as a custom window
+WINDOWS = {'5d': 5, '10d': WEEKLY_DAYS, '1m': 21, '3m': 63, 'ytd': 'ytd', 'all': None}
+WINDOW_TITLES = {'5d': 'Last Week', '10d': 'Last Two Weeks', '1m': 'Last Month', '3m': 'Last Quarter',
+                 'ytd': 'Year to Date', 'all': 'All Time'}
+# The window the weekly board and chart have always used: the last two workweeks
+DEFAULT_WINDOW = '10d'
+
+
+def parse_window(window):
+    """Canonical window name for e.g. '1m', 'YTD', '30' or '30d'; ValueError for anything else."""
+    if window is None or window == '':
+        return DEFAULT_WINDOW
+    name = str(window).strip().lower()
+    if name in WINDOWS:
+        return name
+    days = name[:-1] if name.endswith('d') else name
+    if days.isdigit() and int(days) >= 2:
+        return f"{int(days)}d"
+    raise ValueError(f"Unknown window '{window}', expected one of {', '.join(WINDOWS)} or a number of days")
+
+
+def window_length(window):
+    """Closes in the window, 'ytd', or None for the whole history."""
+    window = parse_window(window)
+    if window in WINDOWS:
+        return WINDOWS[window]
+    return int(window[:-1])
+
+
+def window_title(window):
+    window = parse_window(window)
+    return WINDOW_TITLES.get(window, f"Last {window_length(window)} Trading Days")
+
+
+def trailing(series, window):
+    """The part of one value series a window covers, by the same rules RollingAnalytics uses."""
+    series = series.dropna()
+    days = window_length(window)
+    if days is None or series.empty:
+        return series
+    if days == 'ytd':
+        year_start = pd.Timestamp(year=series.index[-1].year, month=1, day=1)
+        # Measure from the last close of the previous year when there is one
+        first = max(int((series.index < year_start).sum()) - 1, 0)
+        return series.iloc[first:]
+    return series.tail(days)
+
+
+class RollingAnalytics:
+    """Return, volatility and Sharpe over any trailing window, for every user at once.
+
+    One O(dates x users) pass packs each user's closes to the top of their column and takes
+    prefix sums of their daily returns and squared returns. After that a window's stats are a
+    difference of two prefix entries per user, whatever the window length.
+    """
+
+    def __init__(self, portfolios, version=None):
+        # Matches the store version the data was read at, so callers can tell when it is stale
+        self.version = version
+        self.users = [str(user) for user in portfolios.columns]
+        self._columns = {user: i for i, user in enumerate(self.users)}
+        self.dates = portfolios.index.values.astype('datetime64[D]')
+        self._lock = threading.Lock()
+
+        size = (len(self.dates), len(self.users))
+        self.counts = np.zeros(len(self.users), dtype=np.int64)
+        self.closes = np.full(size, np.nan)
+        self.closes_before = np.zeros((len(self.dates) + 1, len(self.users)), dtype=np.int64)
+        self.sum_returns = np.zeros(size)
+        self.sum_squares = np.zeros(size)
+        if len(self.users):
+            self._fill(slice(None), portfolios.to_numpy(dtype=np.float64))
+
+    def _fill(self, columns, values):
+        valid = np.isfinite(values)
+        self.counts[columns] = valid.sum(axis=0)
+
+        # Stored closes first, in date order, so a trailing window is just position arithmetic
+        order = np.argsort(~valid, axis=0, kind='stable')
+        closes = np.take_along_axis(values, order, axis=0)
+        self.closes[:, columns] = closes
+
+        # How many of each user's closes come before each axis date, for calendar windows (YTD)
+        self.closes_before[1:, columns] = np.cumsum(valid, axis=0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            daily_returns = np.nan_to_num(closes[1:] / closes[:-1] - 1)
+        if len(daily_returns):
+            self.sum_returns[1:, columns] = np.cumsum(daily_returns, axis=0)
+            self.sum_squares[1:, columns] = np.cumsum(daily_returns ** 2, axis=0)
+
+    def __contains__(self, user):
+        return user in self._columns
+
+    def update(self, user, series):
+        """Redo one existing user's column in O(dates); False if it needs a full rebuild instead."""
+        column = self._columns.get(user)
+        if column is None:
+            return False
+        series = series.dropna()
+        dates = series.index.values.astype('datetime64[D]')
+        if not np.isin(dates, self.dates).all():
+            return False
+
+        values = np.full((len(self.dates), 1), np.nan)
+        values[np.searchsorted(self.dates, dates), 0] = series.to_numpy(dtype=np.float64)
+        with self._lock:
+            self._fill(slice(column, column + 1), values)
+        return True
+
+    def _window_starts(self, days, columns, ends):
+        if days is None or not len(self.dates):
+            # An empty store has no windows to start
+            return np.zeros_like(ends)
+        if days == 'ytd':
+            # From the last close before January 1st of the latest stored year, when there is one
+            year_start = np.datetime64(f"{self.dates[-1].astype(object).year}-01-01", 'D')
+            before = self.closes_before[np.searchsorted(self.dates, year_start), columns]
+            return np.maximum(before - 1, 0)
+        return np.maximum(ends - days + 1, 0)
+
+    def _window(self, days, columns):
+        # (start, end) close positions of each column's window; callers hold the lock
+        ends = self.counts[columns] - 1
+        return self._window_starts(days, columns, ends), ends
+
+    def _stats(self, days, columns):
+        with self._lock:
+            starts, ends = self._window(days, columns)
+            returns_in_window = ends - starts
+            normalized_return = self.closes[ends, columns] / self.closes[starts, columns]
+            total = self.sum_returns[ends, columns] - self.sum_returns[starts, columns]
+            total_squares = self.sum_squares[ends, columns] - self.sum_squares[starts, columns]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / returns_in_window
+            variance = (total_squares - returns_in_window * mean ** 2) / (returns_in_window - 1)
+            volatility = np.sqrt(np.maximum(variance, 0))
+            sharpe_ratio = np.where(volatility > 0, mean / volatility, 0.0)
+
+        return pd.DataFrame({
+            'Return': normalized_return,
+            'Volatility': volatility,
+            'Sharpe Ratio': sharpe_ratio,
+            'Days': returns_in_window + 1,
+        }, index=pd.Index([self.users[column] for column in columns], name='user'))
+
+    def stats(self, window=DEFAULT_WINDOW):
+        """DataFrame indexed by user: normalized Return (last / first close), daily Volatility,
+        Sharpe Ratio (risk-free rate 0, as in the stock metrics) and the Days it covers."""
+        return self._stats(window_length(window), np.flatnonzero(self.counts > 0))
+
+    def top(self, window=DEFAULT_WINDOW, k=3, exclude=None):
+        """The k best (user, return, volatility, sharpe) by window return, ties broken by username."""
+        days = window_length(window)
+        with self._lock:
+            columns = np.flatnonzero(self.counts > 0)
+            starts, ends = self._window(days, columns)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                returns = self.closes[ends, columns] / self.closes[starts, columns]
+
+        keep = np.isfinite(returns)
+        if exclude in self._columns:
+            keep &= columns != self._columns[exclude]
+        columns, returns = columns[keep], returns[keep]
+        if len(returns) > k > 0:
+            # Everything tied with the k-th best return stays in, so the name tie-break still decides
+            kth_best = -np.partition(-returns, k - 1)[k - 1]
+            candidates = returns >= kth_best
+            columns, returns = columns[candidates], returns[candidates]
+
+        names = np.array([self.users[column] for column in columns], dtype=str)
+        best = columns[np.lexsort((names, -returns))[:k]]
+        table = self._stats(days, best)
+        return [(user, float(row['Return']), float(row['Volatility']), float(row['Sharpe Ratio']))
+                for user, row in table.iterrows()]
+
+_analytics = None
+
+
+def get_rolling_analytics(store=None):
+    """Analytics over the whole portfolio store, rebuilt only when the store has changed."""
+    global _analytics
+    if store is None:
+        store = get_portfolio_store()
+    version = store.version
+    analytics = _analytics
+    if analytics is None or analytics.version != version:
+        analytics = _analytics = RollingAnalytics(store.frame(), version=version)
+    return analytics
+
+
+def record_rolling(user, series, store=None):
+    """Fold a user's freshly stored series in without a rebuild, when ours was the only write since."""
+    if store is None:
+        store = get_portfolio_store()
+    analytics = _analytics
+    version = store.version
+    if analytics is not None and analytics.version == version - 1 and analytics.update(user, series):
+        analytics.version = version
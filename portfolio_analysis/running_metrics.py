@@ -0,0 +1,155 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from portfolio_analysis.metrics import METRIC_COLUMNS, masked_mean_std
+from portfolio_analysis.price_panel import get_price_panel
+
+RUNNING_METRICS_FILE = 'running_metrics.npz'
+
+# Per-symbol running statistics, each stored as one array across all symbols
+_STATE_FIELDS = ['count', 'mean', 'm2', 'down_count', 'down_mean', 'down_m2', 'first_price', 'last_price']
+
+
+class RunningMetrics:
+    """Streaming (Welford) return statistics per symbol, so a new trading day costs O(1) per symbol."""
+
+    def __init__(self, symbols=(), last_dates=None, **state):
+        self.symbols = list(symbols)
+        self._slots = {symbol: i for i, symbol in enumerate(self.symbols)}
+        size = len(self.symbols)
+        self.last_dates = (np.asarray(last_dates, dtype='datetime64[D]') if last_dates is not None
+                           else np.full(size, np.datetime64('NaT'), dtype='datetime64[D]'))
+        for field in _STATE_FIELDS:
+            default = np.full(size, np.nan) if field.endswith('price') else np.zeros(size)
+            setattr(self, field, np.asarray(state.get(field, default), dtype=np.float64))
+
+    def __contains__(self, symbol):
+        return symbol in self._slots
+
+    def _slot(self, symbol):
+        slot = self._slots.get(symbol)
+        if slot is None:
+            # First time we see this symbol: grow every array by one empty slot
+            slot = len(self.symbols)
+            self.symbols.append(symbol)
+            self._slots[symbol] = slot
+            self.last_dates = np.append(self.last_dates, np.datetime64('NaT', 'D'))
+            for field in _STATE_FIELDS:
+                empty = np.nan if field.endswith('price') else 0.0
+                setattr(self, field, np.append(getattr(self, field), empty))
+        return slot
+
+    def update(self, symbol, prices):
+        """Fold a symbol's new prices (date-indexed Series) into its state; older dates are skipped."""
+        slot = self._slot(symbol)
+        prices = prices.dropna().sort_index()
+        dates = prices.index.values.astype('datetime64[D]')
+        last_date = self.last_dates[slot]
+        if not np.isnat(last_date):
+            keep = dates > last_date
+            prices, dates = prices[keep], dates[keep]
+
+        applied = 0
+        for date, price in zip(dates, prices.to_numpy(dtype=np.float64)):
+            previous = self.last_price[slot]
+            if math.isnan(previous):
+                self.first_price[slot] = price
+            else:
+                self._add_return(slot, price / previous - 1)
+            self.last_price[slot] = price
+            self.last_dates[slot] = date
+            applied += 1
+        return applied
+
+    def _add_return(self, slot, daily_return):
+        # Welford's update for mean and M2, once for all returns and once for the downside ones
+        self.count[slot] += 1
+        delta = daily_return - self.mean[slot]
+        self.mean[slot] += delta / self.count[slot]
+        self.m2[slot] += delta * (daily_return - self.mean[slot])
+
+        if daily_return < 0:
+            self.down_count[slot] += 1
+            delta = daily_return - self.down_mean[slot]
+            self.down_mean[slot] += delta / self.down_count[slot]
+            self.down_m2[slot] += delta * (daily_return - self.down_mean[slot])
+
+    def metrics_table(self):
+        """Current metrics for every symbol, in the same layout as cross_sectional_metrics."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Sample std is NaN below two returns, as in cross_sectional_metrics
+            volatility = np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+            downside_volatility = np.where(self.down_count > 1,
+                                           np.sqrt(self.down_m2 / (self.down_count - 1)), np.nan)
+            mean = np.where(self.count > 0, self.mean, np.nan)
+            table = pd.DataFrame({
+                'Cumulative Return': (self.last_price - self.first_price) / self.first_price,
+                'Avg. Daily Return': mean,
+                'Volatility': volatility,
+                'Sharpe Ratio': np.where(volatility != 0, mean / volatility, 0.0),
+                'Sortino Ratio': np.where(downside_volatility != 0, mean / downside_volatility, 0.0),
+            }, index=pd.Index(self.symbols, name='stock_name'))
+        return table[METRIC_COLUMNS].round(4)
+
+    def save(self, file_path=RUNNING_METRICS_FILE):
+        # Write next to the target then swap it in, so a crash never leaves half a state file
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, symbols=np.array(self.symbols, dtype=str), last_dates=self.last_dates,
+                     **{field: getattr(self, field) for field in _STATE_FIELDS})
+        os.replace(tmp_path, file_path)
+
+
+def load_running_metrics(file_path=RUNNING_METRICS_FILE):
+    """Load the persisted state, seeding it from the full price history the first time."""
+    if not os.path.exists(file_path):
+        return seed_running_metrics()
+
+    with np.load(file_path) as state:
+        return RunningMetrics(state['symbols'].tolist(), state['last_dates'],
+                              **{field: state[field] for field in _STATE_FIELDS})
+
+
+def seed_running_metrics(prices=None):
+    """Build the state from a full dates x symbols price history (the price panel by default)."""
+    if prices is None:
+        panel = get_price_panel()
+        prices = panel.frame(panel.symbols) if panel is not None else pd.DataFrame()
+    if prices.empty:
+        # No panel built yet (or nothing in it): start empty, update() adds symbols as rows arrive
+        return RunningMetrics()
+
+    # One vectorized pass over the history instead of replaying it day by day
+    values = prices.to_numpy(dtype=np.float64)
+    has_price = np.isfinite(values)
+    first_row = has_price.argmax(axis=0)
+    last_row = len(values) - 1 - has_price[::-1].argmax(axis=0)
+    columns = np.arange(values.shape[1])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily_returns = values[1:] / values[:-1] - 1
+    has_return = np.isfinite(daily_returns)
+    is_down = has_return & (daily_returns < 0)
+    mean, std = masked_mean_std(daily_returns, has_return)
+    down_mean, down_std = masked_mean_std(daily_returns, is_down)
+    count = has_return.sum(axis=0).astype(np.float64)
+    down_count = is_down.sum(axis=0).astype(np.float64)
+
+    running = RunningMetrics(
+        [str(symbol) for symbol in prices.columns],
+        prices.index.values.astype('datetime64[D]')[last_row],
+        count=count,
+        mean=np.nan_to_num(mean),
+        # M2 is the sum of squared deviations, i.e. variance * (n - 1)
+        m2=np.nan_to_num(std ** 2 * (count - 1)),
+        down_count=down_count,
+        down_mean=np.nan_to_num(down_mean),
+        down_m2=np.nan_to_num(down_std ** 2 * (down_count - 1)),
+        first_price=values[first_row, columns],
+        last_price=values[last_row, columns],
+    )
+    print(f"Seeded running metrics for {len(running.symbols)} symbols.")
+    return running
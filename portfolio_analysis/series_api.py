@@ -0,0 +1,66 @@
+import numpy as np
+
+from portfolio_analysis.assess_portfolio import read_adj_close, read_portfolio
+from portfolio_analysis.reference_data import reference_data
+from portfolio_analysis.rolling import DEFAULT_WINDOW, trailing
+
+
+def downsample_positions(length, max_points):
+    """Evenly spaced positions to keep, always including the first and last point."""
+    if max_points is None or length <= max_points:
+        return np.arange(length)
+    if max_points < 2:
+        return np.array([length - 1])
+    return np.unique(np.linspace(0, length - 1, max_points).round().astype(np.int64))
+
+
+def to_columnar(series, max_points=None):
+    """Series -> {'days': [days since 1970-01-01], 'values': [floats]}, optionally downsampled.
+
+    Days without a finite value (e.g. before a late listing) are left out: JSON has no NaN.
+    """
+    values = np.asarray(series, dtype=np.float64)
+    days = series.index.values.astype('datetime64[D]').astype(np.int64)
+    finite = np.isfinite(values)
+    days, values = days[finite], values[finite]
+
+    positions = downsample_positions(len(values), max_points)
+    return {'days': days[positions].tolist(), 'values': values[positions].tolist()}
+
+
+def normalized(series):
+    # Relative to the first day with a price, not a leading gap
+    series = series.dropna()
+    return series / series.iloc[0]
+
+
+def stock_series(symbol, max_points=None):
+    # Same Adj Close history that plot_solo_stock draws
+    prices = read_adj_close(symbol)[symbol]
+    return {'symbol': symbol, **to_columnar(prices, max_points)}
+
+
+def portfolio_series(username, max_points=None):
+    # Same normalized portfolio and SPY lines that plot_user_portfolio draws
+    portfolio = read_portfolio(username)
+    spy_normalized = reference_data.current().spy_normalized
+    return {
+        'user': username,
+        'portfolio': to_columnar(normalized(portfolio), max_points),
+        'spy': to_columnar(spy_normalized, max_points)
+    }
+
+
+def league_series(username, top_three, board, max_points=None, window=DEFAULT_WINDOW):
+    # Same lines as the league charts: the user plus the top three, each normalized to its first day.
+    # The historical board covers everything, the weekly board the given trailing window.
+    lines = {}
+    for user in [username] + list(top_three):
+        portfolio = read_portfolio(user)
+        if board == 'weekly':
+            portfolio = trailing(portfolio, window)
+        lines[user] = to_columnar(normalized(portfolio), max_points)
+    result = {'board': board, 'user': username, 'series': lines}
+    if board == 'weekly':
+        result['window'] = window
+    return result
@@ -0,0 +1,223 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# TRACE_LOG=0 turns off the per-request JSON log lines; /metrics keeps counting either way
+TRACE_LOG = os.environ.get('TRACE_LOG', '1') != '0'
+# Only log requests at least this slow, e.g. TRACE_LOG_MIN_MS=250 to see just the slow ones
+TRACE_LOG_MIN_MS = float(os.environ.get('TRACE_LOG_MIN_MS', 0))
+# Spans kept per request log line; later ones still reach /metrics and are counted as dropped
+MAX_SPANS_PER_TRACE = int(os.environ.get('TRACE_MAX_SPANS', 200))
+
+# Histogram bucket upper bounds in seconds, from a cache hit to a cold chart render
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SPAN_METRIC = 'melee_span_duration_seconds'
+REQUEST_METRIC = 'melee_request_duration_seconds'
+METRIC_HELP = {
+    SPAN_METRIC: 'Time spent in each traced stage (panel loads, valuation, leaders, rendering, bcrypt, Mongo).',
+    REQUEST_METRIC: 'Time to serve each request, by endpoint, method and status.',
+}
+
+
+class Histogram:
+    """Prometheus-style histogram: a count per bucket, plus the sum and count of every observation."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, observations at or below it) per bucket, ending with +Inf."""
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        total = 0
+        result = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+class MetricsRegistry:
+    """Histograms keyed by metric name and label values, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # metric name -> {((label, value), ...): Histogram}
+        self._histograms = {}
+
+    def observe(self, metric, labels, value):
+        key = tuple(labels.items())
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms = {}
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric in sorted(self._histograms):
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} histogram")
+                for key in sorted(self._histograms[metric]):
+                    histogram = self._histograms[metric][key]
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{metric}_bucket{{{_labels(key + (('le', bound),))}}} {count}")
+                    lines.append(f"{metric}_sum{{{_labels(key)}}} {histogram.sum}")
+                    lines.append(f"{metric}_count{{{_labels(key)}}} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class Trace:
+    """Spans recorded while serving one request."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans = []
+        self.dropped_spans = 0
+        # Names of the spans currently open, innermost last, so each span knows its parent
+        self.stack = []
+
+
+# The current request's Trace; None outside a request (startup, render processes, scripts)
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def observe(name, seconds):
+    """Count a duration measured elsewhere (e.g. a job in another process) under span `name`."""
+    registry.observe(SPAN_METRIC, {'span': name}, seconds)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as stage `name`: always into /metrics, and into the request's log if in one."""
+    trace = _current_trace.get()
+    parent = trace.stack[-1] if trace is not None and trace.stack else None
+    if trace is not None:
+        trace.stack.append(name)
+    error = None
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        observe(name, seconds)
+        if trace is not None:
+            trace.stack.pop()
+            _record_span(trace, name, start, seconds, parent, attributes, error)
+
+
+def _record_span(trace, name, start, seconds, parent, attributes, error):
+    if len(trace.spans) >= MAX_SPANS_PER_TRACE:
+        trace.dropped_spans += 1
+        return
+    record = {'name': name,
+              'start_ms': round((start - trace.start) * 1000, 3),
+              'duration_ms': round(seconds * 1000, 3)}
+    if parent is not None:
+        record['parent'] = parent
+    if attributes:
+        record['attributes'] = attributes
+    if error is not None:
+        record['error'] = error
+    trace.spans.append(record)
+
+
+def traced(name):
+    """Decorator form of span(), for functions that are a stage on their own."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def log_request(record):
+    # One JSON object per line, so the log shipper can index every field
+    print(json.dumps(record, default=str), flush=True)
+
+
+def init_app(app, metrics_path='/metrics'):
+    """Trace every request to `app` and serve the histograms at metrics_path."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_trace():
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+        g.trace_token = _current_trace.set(Trace(request_id))
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = _current_trace.get()
+        if trace is None:
+            return response
+        seconds = time.perf_counter() - trace.start
+        endpoint = request.endpoint or 'unmatched'
+        registry.observe(REQUEST_METRIC, {'endpoint': endpoint, 'method': request.method,
+                                          'status': str(response.status_code)}, seconds)
+        response.headers['X-Request-ID'] = trace.request_id
+
+        if TRACE_LOG and seconds * 1000 >= TRACE_LOG_MIN_MS and endpoint != 'metrics':
+            log_request({'event': 'request',
+                         'request_id': trace.request_id,
+                         'method': request.method,
+                         'path': request.path,
+                         'endpoint': endpoint,
+                         'status': response.status_code,
+                         'duration_ms': round(seconds * 1000, 3),
+                         'spans': trace.spans,
+                         'dropped_spans': trace.dropped_spans})
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            _current_trace.reset(token)
+
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule(metrics_path, 'metrics', metrics)
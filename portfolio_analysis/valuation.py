@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+
+def build_allocation_matrix(portfolios, symbols):
+    """Turn [(symbols, allocations), ...] into an N x K matrix over the shared symbol list."""
+    columns = {symbol: i for i, symbol in enumerate(symbols)}
+    allocations = np.zeros((len(portfolios), len(symbols)))
+
+    for row, (portfolio_symbols, portfolio_allocs) in enumerate(portfolios):
+        for symbol, alloc in zip(portfolio_symbols, portfolio_allocs):
+            # += so a symbol listed twice in one portfolio keeps its full weight
+            allocations[row, columns[symbol]] += alloc
+
+    return allocations
+
+
+def value_portfolios(prices, allocations, start_vals=10000, decimals=None):
+    """Value N portfolios at once.
+
+    prices is a T x K array (or DataFrame) of prices, allocations an N x K array of
+    fractional weights, and start_vals a scalar or length-N array. Returns a T x N
+    array of portfolio values. With decimals, each holding's value is rounded before
+    the holdings are summed, as the app's saved portfolio values always have been.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    allocations = np.atleast_2d(np.asarray(allocations, dtype=np.float64))
+    start_vals = np.broadcast_to(np.asarray(start_vals, dtype=np.float64), (allocations.shape[0],))
+
+    # Normalize every symbol to its first day, then one matmul gives every portfolio's value
+    normalized = prices / prices[0]
+    if decimals is None:
+        holdings = allocations * start_vals[:, None]
+        return normalized @ holdings.T
+
+    # Only the held (portfolio, symbol) pairs, so rounding never touches an N x K x T cube
+    rows, columns = np.nonzero(allocations)
+    holding_values = np.round(normalized[:, columns] * allocations[rows, columns] * start_vals[rows], decimals)
+    values = np.zeros((len(prices), allocations.shape[0]))
+    np.add.at(values.T, rows, holding_values.T)
+    return values
+
+
+def value_portfolios_frame(prices, allocations, start_vals=10000, names=None, decimals=None):
+    """DataFrame wrapper around value_portfolios, one column per portfolio."""
+    values = value_portfolios(prices, allocations, start_vals, decimals)
+    return pd.DataFrame(values, index=prices.index, columns=names)
@@ -0,0 +1,123 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_analysis import leaderboard
+from portfolio_analysis.leaderboard import Leaderboard, board_returns, record_portfolio
+from portfolio_analysis.portfolio_store import PortfolioStore
+
+
+def expected_order(returns):
+    # Best return first, ties by name: the board's (-return, user) key order
+    return sorted(returns.items(), key=lambda item: (-item[1], item[0]))
+
+
+@pytest.fixture
+def returns():
+    rng = random.Random(7)
+    # Rounded so plenty of users tie on return
+    return {f"user{i:03d}": round(rng.uniform(0.8, 1.3), 2) for i in range(300)}
+
+
+@pytest.fixture(params=['update', 'load'])
+def board(request, returns):
+    board = Leaderboard()
+    if request.param == 'update':
+        for user, normalized_return in returns.items():
+            board.update(user, normalized_return)
+    else:
+        board.load(returns)
+    return board
+
+
+def test_rank_page_top_and_percentile_match_a_sorted_list(board, returns):
+    order = expected_order(returns)
+    assert len(board) == len(order)
+
+    for position, (user, normalized_return) in enumerate(order):
+        assert board.rank(user) == position + 1
+        assert board.get(user) == normalized_return
+        assert board.percentile(user) == pytest.approx(100.0 * (len(order) - position) / len(order))
+
+    for offset, limit in [(0, 10), (37, 50), (290, 50), (300, 5)]:
+        assert board.page(offset, limit) == [(offset + i + 1, user, normalized_return)
+                                             for i, (user, normalized_return) in enumerate(order[offset:offset + limit])]
+
+    assert board.top(3) == order[:3]
+    assert board.top(3, exclude=order[1][0]) == [order[0], order[2], order[3]]
+
+
+def test_update_moves_and_removes_users(board, returns):
+    board.update('user000', 5.0)
+    assert board.rank('user000') == 1
+    board.update('user001', float('nan'))
+    assert 'user001' not in board
+    board.remove('user002')
+
+    returns = dict(returns, user000=5.0)
+    del returns['user001'], returns['user002']
+    assert board.page(0, len(returns)) == [(i + 1, user, r) for i, (user, r) in enumerate(expected_order(returns))]
+    assert board.rank('user001') is None
+
+
+def test_load_skips_non_finite_returns():
+    board = Leaderboard()
+    board.load({'a': 1.1, 'b': float('nan'), 'c': float('inf'), 'd': 0.9})
+    assert board.page(0, 10) == [(1, 'a', 1.1), (2, 'd', 0.9)]
+
+
+def test_board_returns_match_record_portfolio_per_column():
+    dates = pd.bdate_range('2024-08-01', periods=30)
+    rng = np.random.default_rng(3)
+    frame = pd.DataFrame(10000 * np.cumprod(1 + rng.normal(0, 0.01, (30, 6)), axis=0), index=dates,
+                         columns=list('abcdef'))
+    frame.iloc[5:9, 1] = np.nan      # gap in the middle
+    frame.iloc[-4:, 2] = np.nan      # stopped early
+    frame.iloc[:25, 3] = np.nan      # fewer values than the weekly window
+    frame.iloc[:, 4] = np.nan        # nothing stored
+
+    historical, weekly = board_returns(frame)
+    for column, user in enumerate(frame.columns):
+        portfolio = frame[user].dropna()
+        if portfolio.empty:
+            assert np.isnan(historical[column]) and np.isnan(weekly[column])
+            continue
+        recent = portfolio.tail(leaderboard.WEEKLY_DAYS)
+        assert historical[column] == portfolio.iloc[-1] / portfolio.iloc[0]
+        assert weekly[column] == recent.iloc[-1] / recent.iloc[0]
+
+
+def test_boards_follow_writes_from_another_store_handle(tmp_path, monkeypatch):
+    # Two handles on one directory stand in for two worker processes
+    ours = PortfolioStore(str(tmp_path))
+    theirs = PortfolioStore(str(tmp_path))
+    dates = pd.bdate_range('2024-08-01', periods=15)
+    ours.replace_many(pd.DataFrame({'a': np.linspace(100, 110, 15), 'b': np.linspace(100, 120, 15)},
+                                   index=dates))
+    monkeypatch.setattr(leaderboard, '_loaded_version', None)
+    for board in leaderboard.LEADERBOARDS.values():
+        monkeypatch.setattr(board, '_tree', board._tree)
+        board.clear()
+
+    leaderboard.ensure_leaderboards_loaded(ours)
+    assert leaderboard.historical_leaderboard.top(2) == [('b', 1.2), ('a', 1.1)]
+
+    reloads = []
+    monkeypatch.setattr(leaderboard, 'load_leaderboards', lambda store=None: reloads.append(store))
+    theirs.replace('a', pd.Series(np.linspace(100, 150, 15), index=dates))
+    theirs.replace('c', pd.Series(np.linspace(100, 90, 15), index=dates))
+    leaderboard.ensure_leaderboards_loaded(ours)
+
+    # Caught up user by user, without a full reload
+    assert reloads == []
+    assert leaderboard.historical_leaderboard.page(0, 5) == [(1, 'a', 1.5), (2, 'b', 1.2), (3, 'c', 0.9)]
+    assert leaderboard._loaded_version == ours.version
+
+    # Our own write is already on the board; the next read only re-reads that user
+    ours.replace('b', pd.Series(np.linspace(100, 200, 15), index=dates))
+    record_portfolio('b', ours.series('b'))
+    leaderboard.ensure_leaderboards_loaded(ours)
+    assert reloads == []
+    assert leaderboard.historical_leaderboard.rank('b') == 1
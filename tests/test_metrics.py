@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calc_stats
+from portfolio_analysis.metrics import METRIC_COLUMNS, cross_sectional_metrics, metrics_documents
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(11)
+    dates = pd.bdate_range('2023-01-02', periods=260)
+    frame = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0.0005, 0.02, (260, 5)), axis=0),
+                         index=pd.DatetimeIndex(dates, name='Date'), columns=['AAA', 'BBB', 'CCC', 'DDD', 'EEE'])
+    frame.iloc[:40, 1] = np.nan      # listed later than the rest
+    frame.iloc[-15:, 2] = np.nan     # delisted early
+    frame.iloc[:, 3] = 50.0          # flat: zero volatility, no downside days
+    return frame
+
+
+def test_cross_sectional_metrics_match_calculate_metrics_per_symbol(prices, tmp_path):
+    table = cross_sectional_metrics(prices)
+    assert list(table.columns) == METRIC_COLUMNS
+
+    for symbol in prices.columns:
+        file_path = tmp_path / f"{symbol}.csv"
+        prices[symbol].dropna().rename('Adj Close').to_frame().to_csv(file_path)
+        expected = calc_stats.metrics_document(symbol, calc_stats.calculate_metrics(str(file_path)))
+
+        actual = table.loc[symbol]
+        for column in METRIC_COLUMNS:
+            if np.isnan(expected[column]):
+                assert np.isnan(actual[column]), (symbol, column)
+            else:
+                # Both round to 4 places; summation order may tip the last digit
+                assert actual[column] == pytest.approx(expected[column], abs=1.01e-4), (symbol, column)
+
+
+def test_metrics_documents_match_metrics_document_shape(prices):
+    documents = metrics_documents(cross_sectional_metrics(prices))
+    assert [document['stock_name'] for document in documents] == list(prices.columns)
+    assert set(documents[0]) == {'stock_name', *METRIC_COLUMNS}
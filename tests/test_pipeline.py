@@ -0,0 +1,100 @@
+import datetime as dt
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import pipeline
+from pipeline import Stage, run_pipeline
+
+
+class Stages:
+    """A diamond of stages that record their calls; `failing` names the stages that raise."""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = set()
+        self._lock = threading.Lock()
+
+    def stage(self, name, after=()):
+        def run(run):
+            with self._lock:
+                self.calls.append(name)
+            if name in self.failing:
+                raise RuntimeError(f"{name} broke")
+            return {'stage': name, 'date': str(run.run_date)}
+        return Stage(name, list(after), run)
+
+    def all(self):
+        return [self.stage('ingest'),
+                self.stage('metrics', ['ingest']),
+                self.stage('portfolios', ['ingest']),
+                self.stage('league_charts', ['portfolios'])]
+
+
+@pytest.fixture
+def run():
+    return SimpleNamespace(run_date=dt.date(2024, 10, 4))
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / 'pipeline_state.json')
+
+
+def statuses(state_path):
+    with open(state_path) as f:
+        return {name: record['status'] for name, record in json.load(f)['stages'].items()}
+
+
+def test_runs_every_stage_after_its_dependencies(run, state_path):
+    stages = Stages()
+    assert run_pipeline(run, stages.all(), state_path)
+    assert stages.calls[0] == 'ingest'
+    assert stages.calls.index('league_charts') > stages.calls.index('portfolios')
+    assert statuses(state_path) == dict.fromkeys(['ingest', 'metrics', 'portfolios', 'league_charts'], pipeline.DONE)
+
+
+def test_resumes_after_a_failed_stage(run, state_path):
+    stages = Stages()
+    stages.failing = {'portfolios'}
+    assert not run_pipeline(run, stages.all(), state_path)
+    # league_charts never started: it waits on portfolios
+    assert sorted(stages.calls) == ['ingest', 'metrics', 'portfolios']
+    assert statuses(state_path) == {'ingest': pipeline.DONE, 'metrics': pipeline.DONE,
+                                    'portfolios': pipeline.FAILED}
+    with open(state_path) as f:
+        assert json.load(f)['stages']['portfolios']['error'] == 'RuntimeError: portfolios broke'
+
+    stages.calls.clear()
+    stages.failing.clear()
+    assert run_pipeline(run, stages.all(), state_path)
+    assert stages.calls == ['portfolios', 'league_charts']
+    assert set(statuses(state_path).values()) == {pipeline.DONE}
+
+    # Nothing left to do for the date
+    stages.calls.clear()
+    assert run_pipeline(run, stages.all(), state_path)
+    assert stages.calls == []
+
+
+def test_restart_and_a_new_date_run_everything_again(run, state_path):
+    stages = Stages()
+    assert run_pipeline(run, stages.all(), state_path)
+
+    stages.calls.clear()
+    assert run_pipeline(run, stages.all(), state_path, restart=True)
+    assert sorted(stages.calls) == ['ingest', 'league_charts', 'metrics', 'portfolios']
+
+    stages.calls.clear()
+    assert run_pipeline(SimpleNamespace(run_date=dt.date(2024, 10, 7)), stages.all(), state_path)
+    assert sorted(stages.calls) == ['ingest', 'league_charts', 'metrics', 'portfolios']
+
+
+def test_next_run_time_skips_weekends():
+    friday_evening = dt.datetime(2024, 10, 4, 18, 0, tzinfo=pipeline.MARKET_TIMEZONE)
+    assert pipeline.next_run_time(friday_evening).date() == dt.date(2024, 10, 7)
+    monday_morning = dt.datetime(2024, 10, 7, 9, 0, tzinfo=pipeline.MARKET_TIMEZONE)
+    assert pipeline.next_run_time(monday_morning) == monday_morning.replace(hour=pipeline.RUN_AT.hour,
+                                                                           minute=pipeline.RUN_AT.minute)
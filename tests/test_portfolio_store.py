@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_analysis import portfolio_store
+from portfolio_analysis.portfolio_store import PortfolioStore
+
+
+def series(dates, values):
+    return pd.Series(np.asarray(values, dtype=float), index=pd.DatetimeIndex(dates))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PortfolioStore(str(tmp_path / 'store'))
+
+
+def test_replace_keeps_other_users_and_drops_missing_values(store):
+    dates = pd.bdate_range('2024-08-01', periods=5)
+    store.replace('alice', series(dates, [100, 101, np.nan, 103, 104]))
+    store.replace('bob', series(dates[2:], [200, 201, 202]))
+
+    assert store.users == ['alice', 'bob']
+    assert store.series('alice').tolist() == [100, 101, 103, 104]
+    assert list(store.series('alice').index) == [dates[0], dates[1], dates[3], dates[4]]
+    assert store.series('bob').tolist() == [200, 201, 202]
+    assert list(store.series('bob').index) == list(dates[2:])
+
+    store.replace('alice', series(dates[:2], [50, 51]))
+    assert store.series('alice').tolist() == [50, 51]
+    assert store.series('bob').tolist() == [200, 201, 202]
+    with pytest.raises(KeyError):
+        store.series('carol')
+
+
+def test_replace_many_and_frame_round_trip(store):
+    dates = pd.bdate_range('2024-08-01', periods=4)
+    portfolios = pd.DataFrame({'a': [1.0, 2, 3, 4], 'b': [np.nan, 5, 6, 7]}, index=dates)
+    store.replace_many(portfolios)
+    frame = store.frame()
+    assert list(frame.columns) == ['a', 'b']
+    np.testing.assert_array_equal(frame.to_numpy(), portfolios.to_numpy())
+    assert store.frame(['b']).columns.tolist() == ['b']
+
+
+def test_append_day_adds_a_date_and_rejects_earlier_ones(store):
+    dates = pd.bdate_range('2024-08-01', periods=3)
+    store.replace('alice', series(dates, [1, 2, 3]))
+    next_day = dates[-1] + pd.offsets.BDay()
+
+    store.append_day(next_day, {'alice': 4.0, 'bob': 10.0})
+    assert store.series('alice').tolist() == [1, 2, 3, 4]
+    assert store.series('bob').index.tolist() == [next_day]
+
+    # The last date can be written again, an earlier one can't
+    store.append_day(next_day, {'alice': 4.5})
+    assert store.series('alice').iloc[-1] == 4.5
+    with pytest.raises(ValueError):
+        store.append_day(dates[0], {'alice': 0.0})
+
+
+def test_inputs_match(store):
+    dates = pd.bdate_range('2024-08-01', periods=3)
+    inputs = (2, 'AAPL', 100, dates[0])
+    store.replace('alice', series(dates, [1, 2, 3]), inputs=inputs)
+    store.replace('bob', series(dates, [1, 2, 3]))
+
+    assert store.inputs_match('alice', inputs)
+    assert not store.inputs_match('alice', (2, 'MSFT', 100, dates[0]))
+    assert not store.inputs_match('alice', None)
+    assert not store.inputs_match('bob', None)
+    assert not store.inputs_match('carol', inputs)
+
+    store.replace_many(pd.DataFrame({'bob': [4.0, 5, 6]}, index=dates), {'bob': inputs})
+    assert store.inputs_match('bob', inputs)
+    assert store.inputs_match('alice', inputs)
+
+    # Appended values weren't computed from the old inputs
+    store.append_day(dates[-1] + pd.offsets.BDay(), {'alice': 4.0})
+    assert not store.inputs_match('alice', inputs)
+    assert store.inputs_match('bob', inputs)
+
+
+def test_capacity_doubles_without_losing_values(store):
+    capacity = portfolio_store.INITIAL_DATE_CAPACITY
+    dates = pd.bdate_range('2024-01-01', periods=3 * capacity)
+    store.replace('alice', series(dates[:capacity], np.arange(capacity)), inputs='a')
+    store.replace('bob', series(dates[:10], np.arange(10) + 1000))
+    assert store.current().capacity == capacity
+
+    for i, date in enumerate(dates[capacity:2 * capacity + 5]):
+        store.append_day(date, {'bob': float(i)})
+    assert store.current().capacity == 4 * capacity
+    assert store.series('alice').tolist() == list(range(capacity))
+    assert store.series('bob').tolist() == list(np.arange(10) + 1000) + list(range(capacity + 5))
+
+    # Back-filling an earlier date re-lays every row as well
+    store.replace('carol', series([dates[0] - pd.offsets.BDay()], [7.0]))
+    assert store.series('alice').tolist() == list(range(capacity))
+    assert store.series('carol').tolist() == [7.0]
+    assert store.inputs_match('alice', 'a')
+
+    # Another handle on the same directory sees the rewritten file
+    other = PortfolioStore(store.store_dir)
+    pd.testing.assert_frame_equal(other.frame(), store.frame())
+
+
+def test_changed_since(store, monkeypatch):
+    dates = pd.bdate_range('2024-08-01', periods=3)
+    start = store.version
+    store.replace('alice', series(dates, [1, 2, 3]))
+    store.append_day(dates[-1], {'bob': 1.0, 'carol': 2.0})
+    assert store.changed_since(start) == (start + 2, {'alice', 'bob', 'carol'})
+    assert store.changed_since(start + 1) == (start + 2, {'bob', 'carol'})
+    assert store.changed_since(store.version) == (store.version, set())
+
+    # Too many users in one write to list them
+    monkeypatch.setattr(portfolio_store, 'CHANGE_LOG_MAX_USERS', 2)
+    version = store.version
+    store.replace_many(pd.DataFrame({'a': [1.0], 'b': [1.0], 'c': [1.0]}, index=dates[-1:]))
+    assert store.changed_since(version) == (version + 1, None)
+
+    # Older than the log reaches
+    monkeypatch.setattr(portfolio_store, 'CHANGE_LOG_VERSIONS', 2)
+    version = store.version
+    for value in range(3):
+        store.append_day(dates[-1], {'alice': float(value)})
+    assert store.changed_since(version) == (version + 3, None)
+    assert store.changed_since(version + 1) == (version + 3, {'alice'})
+
+
+def test_import_csv_portfolios_in_one_write(store, tmp_path):
+    directory = tmp_path / 'user_portfolios'
+    directory.mkdir()
+    dates = pd.bdate_range('2024-08-01', periods=6)
+    expected = {'alice': series(dates, np.arange(6) + 100.0), 'bob': series(dates[2:], [7.0, 8, 9, 10])}
+    for user, values in expected.items():
+        values.rename_axis('Date').rename('Portfolio').to_csv(directory / f"{user}_portfolio.csv")
+    (directory / 'notes.csv').write_text('ignored')
+
+    version = store.version
+    assert portfolio_store.import_csv_portfolios(store, str(directory)) == 2
+    assert store.version == version + 1
+    assert store.changed_since(version) == (version + 1, {'alice', 'bob'})
+    for user, values in expected.items():
+        assert store.series(user).tolist() == values.tolist()
+        assert list(store.series(user).index) == list(values.index)
+
+    assert portfolio_store.import_csv_portfolios(store, str(tmp_path / 'nowhere')) == 0
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from portfolio_analysis.render_cache import cached_image_path, is_cache_filename, static_filename
+from portfolio_analysis.render_service import FAILED, MISSING, PENDING, READY, RenderService
+
+
+@pytest.fixture
+def filename(tmp_path, monkeypatch):
+    # STATIC_DIR is relative to the app's working directory
+    monkeypatch.chdir(tmp_path)
+    return static_filename(cached_image_path('weekly', ('user', 1)))
+
+
+def test_status_in_a_worker_that_never_saw_the_job(filename):
+    service = RenderService(max_workers=1)
+    assert is_cache_filename(filename)
+    assert service.status(filename) == PENDING
+
+    os.makedirs(os.path.dirname(os.path.join('static', filename)))
+    with open(os.path.join('static', filename), 'wb'):
+        pass
+    assert service.status(filename) == READY
+
+
+def test_failed_only_where_the_failure_was_seen(filename):
+    seen, other = RenderService(max_workers=1), RenderService(max_workers=1)
+    seen._failed.add(filename)
+    assert seen.status(filename) == FAILED
+    assert other.status(filename) == PENDING
+
+
+@pytest.mark.parametrize('name', ['render_cache/weekly.png', 'render_cache/weekly_abc.png', 'plots/weekly_'
+                                  + '0' * 32 + '.png', 'render_cache/sub/weekly_' + '0' * 32 + '.png'])
+def test_names_that_cant_be_render_jobs_are_missing(filename, name):
+    assert RenderService(max_workers=1).status(name) == MISSING
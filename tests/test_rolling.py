@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_analysis.rolling import RollingAnalytics
+
+
+@pytest.fixture
+def analytics():
+    rng = np.random.default_rng(9)
+    dates = pd.bdate_range('2023-11-01', periods=120)
+    values = 10000 * np.cumprod(1 + rng.normal(0, 0.01, (120, 60)), axis=0)
+    frame = pd.DataFrame(values, index=dates, columns=[f"user{i:02d}" for i in range(60)])
+    # Two users tied at the top of every window, broken by username
+    frame['tie_b'] = frame['tie_a'] = np.geomspace(10000, 40000, 120)
+    frame.iloc[:100, 3] = np.nan     # joined late
+    frame.iloc[:, 4] = np.nan        # nothing stored
+    return RollingAnalytics(frame)
+
+
+@pytest.mark.parametrize('window', ['5d', '10d', '1m', 'ytd', 'all'])
+@pytest.mark.parametrize('k', [1, 3, 10, 100])
+@pytest.mark.parametrize('exclude', [None, 'user00', 'tie_b', 'nobody'])
+def test_top_matches_sorting_every_users_stats(analytics, window, k, exclude):
+    stats = analytics.stats(window).drop(index=[exclude], errors='ignore')
+    stats = stats[np.isfinite(stats['Return'])].reset_index()
+    expected = stats.sort_values(['Return', 'user'], ascending=[False, True]).head(k)
+
+    top = analytics.top(window, k, exclude)
+    assert [user for user, *_ in top] == expected['user'].tolist()
+    np.testing.assert_array_equal([row[1:] for row in top],
+                                  expected[['Return', 'Volatility', 'Sharpe Ratio']].to_numpy())
+
+
+@pytest.mark.parametrize('window', ['5d', 'ytd', 'all'])
+def test_an_empty_store_has_no_leaders(window):
+    empty = RollingAnalytics(pd.DataFrame())
+    assert empty.top(window) == []
+    assert empty.stats(window).empty
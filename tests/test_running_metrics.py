@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_analysis.metrics import cross_sectional_metrics
+from portfolio_analysis.running_metrics import load_running_metrics, seed_running_metrics
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(5)
+    dates = pd.bdate_range('2024-01-02', periods=120)
+    frame = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0, 0.015, (120, 4)), axis=0),
+                         index=pd.DatetimeIndex(dates, name='Date'), columns=['AAA', 'BBB', 'CCC', 'DDD'])
+    frame.iloc[:30, 1] = np.nan      # listed later than the rest
+    frame.iloc[:, 2] = 20.0          # flat
+    return frame
+
+
+def assert_tables_close(actual, expected):
+    assert list(actual.index) == list(expected.index)
+    assert list(actual.columns) == list(expected.columns)
+    # Both round to 4 places; Welford and the two-pass sums may tip the last digit
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=0, atol=1.01e-4)
+
+
+def test_seed_matches_cross_sectional_metrics(prices):
+    assert_tables_close(seed_running_metrics(prices).metrics_table(), cross_sectional_metrics(prices))
+
+
+@pytest.mark.parametrize('seed_rows', [2, 60, 119])
+def test_update_with_appended_rows_matches_seeding_the_whole_history(prices, seed_rows):
+    running = seed_running_metrics(prices.iloc[:seed_rows])
+    for symbol in prices.columns:
+        # Overlapping dates are skipped, so passing the whole history is safe
+        running.update(symbol, prices[symbol])
+
+    assert_tables_close(running.metrics_table(), seed_running_metrics(prices).metrics_table())
+    assert running.update('AAA', prices['AAA']) == 0
+
+
+def test_update_adds_new_symbols(prices):
+    running = seed_running_metrics(prices[['AAA']])
+    assert running.update('BBB', prices['BBB']) == prices['BBB'].count()
+    assert_tables_close(running.metrics_table(), seed_running_metrics(prices[['AAA', 'BBB']]).metrics_table())
+
+
+def test_seeding_without_prices_starts_empty(prices, tmp_path, monkeypatch):
+    # A fresh checkout: no price panel has been built yet
+    monkeypatch.chdir(tmp_path)
+    assert seed_running_metrics().symbols == []
+
+    for empty in (pd.DataFrame(), prices.iloc[:0], prices.iloc[:, :0]):
+        running = seed_running_metrics(empty)
+        assert running.symbols == []
+        assert running.metrics_table().empty
+
+    running.update('AAA', prices['AAA'])
+    assert_tables_close(running.metrics_table(), seed_running_metrics(prices[['AAA']]).metrics_table())
+
+
+def test_save_and_load_round_trip(prices, tmp_path):
+    running = seed_running_metrics(prices.iloc[:80])
+    file_path = str(tmp_path / 'running_metrics.npz')
+    running.save(file_path)
+    loaded = load_running_metrics(file_path)
+
+    for state in (running, loaded):
+        for symbol in prices.columns:
+            state.update(symbol, prices[symbol])
+    pd.testing.assert_frame_equal(loaded.metrics_table(), running.metrics_table())
@@ -0,0 +1,50 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_analysis import series_api
+from portfolio_analysis.series_api import normalized, to_columnar
+
+
+@pytest.fixture
+def gappy():
+    # Listed on the 6th day, one missing close in the middle
+    dates = pd.bdate_range('2024-08-01', periods=30)
+    values = np.linspace(50, 80, 30)
+    values[:5] = np.nan
+    values[12] = np.nan
+    return pd.Series(values, index=dates)
+
+
+def strict_json(payload):
+    # Browsers' JSON.parse rejects the bare NaN that json.dumps writes by default
+    return json.loads(json.dumps(payload, allow_nan=False))
+
+
+def test_non_finite_points_are_dropped_with_their_days(gappy):
+    columnar = strict_json(to_columnar(gappy))
+    kept = gappy.dropna()
+    assert columnar['values'] == kept.tolist()
+    assert columnar['days'] == (kept.index.values.astype('datetime64[D]').astype(np.int64)).tolist()
+
+
+def test_downsampling_keeps_the_first_and_last_finite_points(gappy):
+    columnar = strict_json(to_columnar(gappy, max_points=5))
+    assert len(columnar['values']) == 5
+    assert columnar['values'][0] == gappy.dropna().iloc[0]
+    assert columnar['values'][-1] == gappy.iloc[-1]
+
+
+def test_normalized_starts_at_the_first_price(gappy):
+    line = normalized(gappy)
+    assert line.iloc[0] == 1.0
+    assert line.iloc[-1] == pytest.approx(80 / gappy.dropna().iloc[0])
+
+
+def test_stock_series_of_a_late_listing_is_valid_json(gappy, monkeypatch):
+    monkeypatch.setattr(series_api, 'read_adj_close', lambda symbol: gappy.rename(symbol).to_frame())
+    payload = strict_json(series_api.stock_series('LATE', max_points=10))
+    assert payload['symbol'] == 'LATE'
+    assert len(payload['days']) == len(payload['values']) == 10
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_analysis.valuation import build_allocation_matrix, value_portfolios, value_portfolios_frame
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(2)
+    dates = pd.bdate_range('2024-08-01', periods=40)
+    return pd.DataFrame(50 * np.cumprod(1 + rng.normal(0, 0.02, (40, 6)), axis=0), index=dates,
+                        columns=['AAA', 'BBB', 'CCC', 'DDD', 'EEE', 'FFF'])
+
+
+def per_holding(prices, symbols, allocations, start_val):
+    # How a single portfolio was always valued: each holding rounded, then summed
+    normalized = prices[symbols] / prices[symbols].iloc[0]
+    return (normalized * allocations * start_val).round(3).sum(axis=1)
+
+
+def test_rounds_each_holding_before_summing(prices):
+    portfolios = [(['AAA', 'CCC'], [0.3, 0.7]), (['BBB', 'DDD', 'FFF'], [0.2, 0.5, 0.3]), (['EEE'], [1.0])]
+    start_vals = [10000, 2500.5, 123]
+    allocations = build_allocation_matrix(portfolios, list(prices.columns))
+    values = value_portfolios_frame(prices, allocations, start_vals, names=['a', 'b', 'c'], decimals=3)
+
+    for name, (symbols, allocs), start_val in zip(values.columns, portfolios, start_vals):
+        expected = per_holding(prices, symbols, allocs, start_val)
+        np.testing.assert_allclose(values[name].to_numpy(), expected.to_numpy(), rtol=0, atol=1e-9)
+
+
+def test_unrounded_values_are_the_exact_weighted_sum(prices):
+    allocations = build_allocation_matrix([(['AAA', 'BBB', 'AAA'], [0.25, 0.5, 0.25])], list(prices.columns))
+    values = value_portfolios(prices, allocations, 10000)[:, 0]
+    normalized = prices / prices.iloc[0]
+    np.testing.assert_allclose(values, 10000 * (0.5 * normalized['AAA'] + 0.5 * normalized['BBB']))